@@ -1,14 +1,139 @@
 import os
+import re
 import json
-from typing import Optional
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from contextlib import aclosing
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterator, Optional
 from dotenv import load_dotenv
 import google.generativeai as genai
+from sqlalchemy import literal, null, union_all, select
 from sqlalchemy.orm import Session
 
+from database import release_db, run_db
 from models import UserProfile, University, ShortlistedUniversity, LockedUniversity, TodoTask
+from cache import TTLCache, make_store
+from semantic_cache import SemanticCache, context_bucket
+from circuit_breaker import ModelCircuitBreaker, NOT_FOUND, RATE_LIMITED
+from rate_limiter import (
+    GEMINI_EST_OUTPUT_TOKENS,
+    PRIORITY_BACKGROUND,
+    PRIORITY_CHAT,
+    GeminiRateLimiter,
+    QueueFull,
+    QueueTimeout,
+    estimate_tokens,
+)
+from metrics import gemini_fallbacks, gemini_latency
+from prompt_builder import PROMPT_TOKEN_BUDGET, PromptBuilder, PromptStats
+from university_service import UniversityService
 
 load_dotenv()
 
+log = logging.getLogger("uvicorn.error")
+
+# Max Gemini calls in flight per process. The SDK call is blocking, so it runs on a
+# dedicated thread pool; anything beyond this waits for a free slot instead of
+# tying up the event loop. Rate-limit waits happen on the event loop, not in the pool.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+
+# Rendered per-student context block (profile, shortlist, locks, todos), keyed by user id.
+# Write endpoints call AICounsellor.invalidate_context; the TTL only bounds staleness
+# from writes that bypass the API (e.g. manual DB edits).
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "1024"))
+CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "300"))
+
+# Generated answers keyed by a hash of their inputs (profile text + model), so a repeat
+# dashboard load is a local lookup. "memory", "sqlite" (survives restarts) or "off".
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+
+# How many pre-ranked universities Gemini chooses recommendations from
+RECOMMEND_CANDIDATES = int(os.getenv("RECOMMEND_CANDIDATES", "25"))
+RECOMMEND_MAX_RESULTS = 10
+_CATEGORIES = ("dream", "target", "safe")
+
+# JSON-mode output needs a google-generativeai release whose GenerationConfig has
+# response_mime_type; on older SDKs the prompt alone asks for JSON.
+_JSON_MODE_SUPPORTED = "response_mime_type" in getattr(genai.types.GenerationConfig, "__annotations__", {})
+
+
+@dataclass
+class CounsellorContext:
+    """Everything the counsellor prompts need to know about one student."""
+    profile: Optional[UserProfile]
+    shortlisted: list[tuple[str, Optional[str]]] = field(default_factory=list)  # (name, category)
+    locked: list[str] = field(default_factory=list)
+    open_todos: list[tuple[str, Optional[str]]] = field(default_factory=list)  # (title, priority)
+
+
+@dataclass(frozen=True)
+class RenderedContext:
+    """Prompt-ready, session-free view of a CounsellorContext; this is what the context cache holds."""
+    profile_text: str
+    shortlisted: tuple
+    locked: tuple
+    open_todos: tuple
+    bucket: tuple
+
+
+def load_counsellor_context(db: Session, user_id: int) -> CounsellorContext:
+    """Load profile, shortlist, locked universities and open todos in two round trips.
+
+    Shortlist, locked and todo rows come back from a single UNION ALL joined against
+    universities, instead of one University lookup per shortlisted/locked row.
+    """
+    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+
+    shortlisted_q = (
+        select(
+            literal("shortlisted").label("kind"),
+            University.name.label("label"),
+            ShortlistedUniversity.category.label("detail"),
+            ShortlistedUniversity.id.label("row_id"),
+        )
+        .join(University, University.id == ShortlistedUniversity.university_id)
+        .where(ShortlistedUniversity.user_id == user_id)
+    )
+    locked_q = (
+        select(
+            literal("locked").label("kind"),
+            University.name.label("label"),
+            null().label("detail"),
+            LockedUniversity.id.label("row_id"),
+        )
+        .join(University, University.id == LockedUniversity.university_id)
+        .where(LockedUniversity.user_id == user_id)
+    )
+    todos_q = (
+        select(
+            literal("todo").label("kind"),
+            TodoTask.title.label("label"),
+            TodoTask.priority.label("detail"),
+            TodoTask.id.label("row_id"),
+        )
+        .where(TodoTask.user_id == user_id, TodoTask.status != "completed")
+    )
+    combined = union_all(shortlisted_q, locked_q, todos_q).subquery()
+    rows = db.execute(select(combined).order_by(combined.c.kind, combined.c.row_id)).all()
+
+    context = CounsellorContext(profile=profile)
+    for kind, label, detail, _ in rows:
+        if kind == "shortlisted":
+            context.shortlisted.append((label, detail))
+        elif kind == "locked":
+            context.locked.append(label)
+        else:
+            context.open_todos.append((label, detail))
+    return context
+
+
 class AICounsellor:
     def __init__(self):
         api_key = os.getenv("GEMINI_API_KEY")
@@ -25,34 +150,233 @@ class AICounsellor:
         model_name = (os.getenv("GEMINI_MODEL") or "").strip() or "gemini-2.0-flash"
         if model_name in _deprecated_models or "gemini-1.5-flash" in model_name:
             model_name = "gemini-2.0-flash"
-        self.model = genai.GenerativeModel(model_name)
         self._model_name = model_name
         self._fallbacks = ["gemini-2.5-flash", "gemini-2.5-flash-lite", "gemini-3-flash-preview"]
+        # One client per model name, created on first use and never swapped out, so
+        # concurrent requests cannot change each other's model.
+        self._models: dict[str, genai.GenerativeModel] = {}
+        self.breaker = ModelCircuitBreaker()
+        self.limiter = GeminiRateLimiter()
+        self._executor = ThreadPoolExecutor(
+            max_workers=GEMINI_MAX_CONCURRENCY,
+            thread_name_prefix="gemini",
+        )
+        self.context_cache = TTLCache(maxsize=CONTEXT_CACHE_SIZE, ttl=CONTEXT_CACHE_TTL_SECONDS)
+        self.response_cache = make_store(RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_PATH)
+        self.semantic_cache = SemanticCache()
+        self.prompt_stats = PromptStats()
+        self.university_service = UniversityService()
+    
+    def _fallback_reason(self, err: Exception) -> Optional[str]:
+        """404 (model gone) and 429 (quota) mean "try the next model"; anything else is a real error."""
+        err_str = str(err)
+        if "404" in err_str or "not found" in err_str.lower():
+            return NOT_FOUND
+        if "429" in err_str or "quota" in err_str.lower():
+            return RATE_LIMITED
+        return None
+    
+    def _get_model(self, model_name: str) -> genai.GenerativeModel:
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models.setdefault(model_name, genai.GenerativeModel(model_name))
+        return model
+    
+    def _candidate_models(self) -> list[str]:
+        """Models to try for one request: primary then fallbacks, skipping open breakers (may be empty)"""
+        return self.breaker.candidates([self._model_name] + self._fallbacks)
+    
+    def _final_error(self, err: Optional[Exception]) -> Exception:
+        """Error to raise once every model has been tried (err is None if all were cooling down)."""
+        if err is None or isinstance(err, (QueueFull, QueueTimeout)) or (
+            err and ("429" in str(err) or "quota" in str(err).lower())
+        ):
+            limit_err = ValueError(
+                "RATE_LIMIT:The AI Counsellor has reached its rate limit. "
+                "Please try again in about a minute. Free tier has daily and per-minute limits. "
+                "See https://ai.google.dev/gemini-api/docs/rate-limits"
+            )
+            limit_err.__cause__ = err
+            return limit_err
+        return err
+    
+    async def _acquire_budget(self, model_name: str, prompt: str, priority: int) -> None:
+        """Wait on the event loop in the model's priority queue for rate-limit budget.
+
+        Raises QueueFull / QueueTimeout. No pool thread is held while waiting.
+        """
+        await self.limiter.acquire(model_name, estimate_tokens(prompt) + GEMINI_EST_OUTPUT_TOKENS, priority)
+    
+    def _call_model(self, model_name: str, prompt: str, json_mode: bool) -> str:
+        """One blocking generate_content call (runs on the Gemini pool); records the breaker outcome."""
+        start = time.perf_counter()
+        try:
+            if json_mode and _JSON_MODE_SUPPORTED:
+                response = self._get_model(model_name).generate_content(
+                    prompt, generation_config={"response_mime_type": "application/json"}
+                )
+            else:
+                response = self._get_model(model_name).generate_content(prompt)
+            text = response.text
+        except Exception as e:
+            reason = self._fallback_reason(e)
+            gemini_latency.observe(time.perf_counter() - start, model_name, reason or "error")
+            if reason:
+                gemini_fallbacks.inc(model_name, reason)
+                self.breaker.record_failure(model_name, reason, e)
+            raise
+        gemini_latency.observe(time.perf_counter() - start, model_name, "ok")
+        self.breaker.record_success(model_name)
+        return text
+    
+    def _stream_model(self, model_name: str, prompt: str) -> Iterator[str]:
+        """Text chunks from one model's stream (iterated on the Gemini pool); records the breaker outcome.
+
+        Latency covers the whole stream, up to the last chunk or the client going away.
+        """
+        start = time.perf_counter()
+        try:
+            for chunk in self._get_model(model_name).generate_content(prompt, stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunk without text parts (e.g. safety metadata only)
+                    continue
+                if text:
+                    yield text
+        except GeneratorExit:
+            gemini_latency.observe(time.perf_counter() - start, model_name, "cancelled")
+            raise
+        except Exception as e:
+            reason = self._fallback_reason(e)
+            gemini_latency.observe(time.perf_counter() - start, model_name, reason or "error")
+            if reason:
+                self.breaker.record_failure(model_name, reason, e)
+            raise
+        gemini_latency.observe(time.perf_counter() - start, model_name, "ok")
+        self.breaker.record_success(model_name)
     
-    def _generate(self, prompt: str) -> str:
-        """Generate content; on 404 or 429 try fallback models."""
+    async def _generate_async(self, prompt: str, priority: int = PRIORITY_CHAT, json_mode: bool = False) -> str:
+        """Generate content; on 404 or 429 open that model's breaker and try the next healthy model.
+
+        Each attempt first waits for client-side budget on the event loop, then makes the
+        blocking call on the Gemini pool. A full queue moves on to the next model; a queue
+        timeout gives up with the rate-limit message.
+        """
+        loop = asyncio.get_running_loop()
         err = None
-        for attempt, model in enumerate([self._model_name] + self._fallbacks):
-            if attempt > 0:
-                self.model = genai.GenerativeModel(model)
+        for model_name in self._candidate_models():
+            probe = self.breaker.allow(model_name)
+            if probe is None:
+                continue  # another request took the half-open probe meanwhile
             try:
-                response = self.model.generate_content(prompt)
-                return response.text
-            except Exception as e:
-                err = e
-                err_str = str(e)
-                if "404" in err_str or "not found" in err_str.lower():
+                try:
+                    await self._acquire_budget(model_name, prompt, priority)
+                except QueueFull as e:
+                    err = e
+                    gemini_fallbacks.inc(model_name, "queue_full")
                     continue
-                if "429" in err_str or "quota" in err_str.lower():
+                except QueueTimeout as e:
+                    raise self._final_error(e)
+                try:
+                    return await loop.run_in_executor(
+                        self._executor, partial(self._call_model, model_name, prompt, json_mode)
+                    )
+                except Exception as e:
+                    if self._fallback_reason(e):
+                        err = e
+                        continue
+                    raise
+            finally:
+                if probe:
+                    self.breaker.end_probe(model_name)
+        raise self._final_error(err)
+    
+    async def _generate_stream_async(self, prompt: str) -> AsyncIterator[str]:
+        """Yield text chunks as Gemini produces them.
+
+        Falls back across models like _generate_async, but only until the first chunk has
+        been yielded; after that the student already has partial text, so errors are raised.
+        """
+        err = None
+        for model_name in self._candidate_models():
+            probe = self.breaker.allow(model_name)
+            if probe is None:
+                continue
+            try:
+                try:
+                    await self._acquire_budget(model_name, prompt, PRIORITY_CHAT)
+                except QueueFull as e:
+                    err = e
+                    gemini_fallbacks.inc(model_name, "queue_full")
                     continue
-                raise
-        if err and ("429" in str(err) or "quota" in str(err).lower()):
-            raise ValueError(
-                "RATE_LIMIT:The AI Counsellor has reached its rate limit. "
-                "Please try again in about a minute. Free tier has daily and per-minute limits. "
-                "See https://ai.google.dev/gemini-api/docs/rate-limits"
-            ) from err
-        raise err
+                except QueueTimeout as e:
+                    raise self._final_error(e)
+                started = False
+                try:
+                    # aclosing: if our caller closes us, stop the pool task now, not when the loop
+                    # gets round to finalizing the inner generator
+                    async with aclosing(self._iterate_on_pool(partial(self._stream_model, model_name, prompt))) as chunks:
+                        async for text in chunks:
+                            started = True
+                            yield text
+                except Exception as e:
+                    reason = self._fallback_reason(e)
+                    if reason and not started:
+                        err = e
+                        gemini_fallbacks.inc(model_name, reason)
+                        continue
+                    raise
+                return
+            finally:
+                if probe:
+                    self.breaker.end_probe(model_name)
+        raise self._final_error(err)
+    
+    async def _iterate_on_pool(self, make_iterator) -> AsyncIterator[str]:
+        """Async view of a blocking iterator.
+
+        One task on the Gemini pool drains the iterator into a queue. If the consumer goes
+        away (client disconnect), a stop flag makes that task close the iterator on its
+        own thread after the item it is reading; the consumer never waits for it.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def emit(item, err=None):
+            if not stop.is_set():
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, (item, err))
+                except RuntimeError:
+                    stop.set()  # event loop already closed
+
+        def produce():
+            items = make_iterator()
+            try:
+                for item in items:
+                    if stop.is_set():
+                        return
+                    emit(item)
+            except Exception as e:
+                emit(done, e)
+                return
+            finally:
+                items.close()
+            emit(done)
+
+        loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                item, err = await queue.get()
+                if item is done:
+                    if err is not None:
+                        raise err
+                    return
+                yield item
+        finally:
+            stop.set()
     
     def _format_profile(self, profile: UserProfile) -> str:
         """Format user profile into a readable string for AI"""
@@ -75,9 +399,18 @@ User Profile:
 """
         return profile_text
     
-    async def analyze_profile(self, profile: UserProfile) -> str:
+    def _fingerprint(self, kind: str, text: str) -> str:
+        """Content address for a generated answer: normalized input text plus the primary model"""
+        normalized = re.sub(r"\s+", " ", text).strip().lower()
+        digest = hashlib.sha256(f"{kind}|{self._model_name}|{normalized}".encode("utf-8")).hexdigest()
+        return f"{kind}:{digest}"
+    
+    async def analyze_profile(self, db: Session, user_id: int) -> str:
         """Analyze user profile and provide insights"""
-        profile_text = self._format_profile(profile)
+        context = load_counsellor_context(db, user_id)
+        if context.profile is None:
+            return "Please complete your profile to get an analysis."
+        profile_text = self._format_profile(context.profile)
         
         prompt = f"""
 You are an expert study-abroad counsellor. Analyze the following student profile and provide:
@@ -91,58 +424,88 @@ You are an expert study-abroad counsellor. Analyze the following student profile
 Provide a clear, structured analysis that helps the student understand their position.
 """
         
+        cache_key = self._fingerprint("analysis", profile_text)
+        if self.response_cache is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        await release_db(db)
+        
         try:
-            return self._generate(prompt)
+            analysis = await self._generate_async(prompt, PRIORITY_BACKGROUND)
         except ValueError as e:
             if "RATE_LIMIT:" in str(e):
                 return str(e).replace("RATE_LIMIT:", "").strip()
             raise
         except Exception as e:
             return f"Error analyzing profile: {str(e)}"
+        
+        # Only successful generations are cached; errors and rate-limit notices are retried next time
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, analysis)
+        return analysis
     
-    async def chat(
+    def _render_context(self, context: CounsellorContext) -> RenderedContext:
+        """Render the per-student context that goes into every chat prompt"""
+        profile_text = (
+            self._format_profile(context.profile).strip() if context.profile else "User Profile: Not provided"
+        )
+        return RenderedContext(
+            profile_text=profile_text,
+            shortlisted=tuple(context.shortlisted),
+            locked=tuple(context.locked),
+            open_todos=tuple(context.open_todos),
+            bucket=context_bucket(context.profile, context.shortlisted, context.locked, context.open_todos),
+        )
+    
+    def _student_context(self, db: Session, user_id: int) -> RenderedContext:
+        """Rendered student context, served from the context cache when possible"""
+        rendered = self.context_cache.get(user_id)
+        if rendered is None:
+            rendered = self._render_context(load_counsellor_context(db, user_id))
+            self.context_cache.set(user_id, rendered)
+        return rendered
+    
+    async def _student_context_async(self, db, user_id: int) -> RenderedContext:
+        """_student_context for a sync Session or an AsyncSession (DB_MODE=async)"""
+        rendered = self.context_cache.get(user_id)
+        if rendered is None:
+            rendered = self._render_context(await run_db(db, load_counsellor_context, user_id))
+            self.context_cache.set(user_id, rendered)
+        return rendered
+    
+    def _record_prompt(self, kind: str, tokens: int, budget: int = PROMPT_TOKEN_BUDGET) -> None:
+        self.prompt_stats.record(tokens, budget)
+        log.info("counsellor prompt kind=%s tokens=%d budget=%d", kind, tokens, budget)
+    
+    def invalidate_context(self, user_id: int) -> None:
+        """Drop a student's cached context; call after profile, shortlist, lock or todo writes"""
+        self.context_cache.invalidate(user_id)
+    
+    def _build_chat_prompt(
         self,
         user_message: str,
-        user_profile: UserProfile,
         current_stage: str,
-        db: Session,
-        user_id: int
+        rendered: RenderedContext
     ) -> str:
-        """Handle chat interaction with context awareness"""
-        profile_text = self._format_profile(user_profile)
-        
-        # Get user's shortlisted and locked universities
-        shortlisted = db.query(ShortlistedUniversity).filter(
-            ShortlistedUniversity.user_id == user_id
-        ).all()
-        
-        locked = db.query(LockedUniversity).filter(
-            LockedUniversity.user_id == user_id
-        ).all()
-        
-        shortlisted_names = []
-        for item in shortlisted:
-            uni = db.query(University).filter(University.id == item.university_id).first()
-            if uni:
-                shortlisted_names.append(f"{uni.name} ({item.category})")
-        
-        locked_names = []
-        for item in locked:
-            uni = db.query(University).filter(University.id == item.university_id).first()
-            if uni:
-                locked_names.append(uni.name)
-        
-        context = f"""
-You are an AI Counsellor helping a student with their study-abroad journey. 
-
-Current Stage: {current_stage}
-User Profile:
-{profile_text}
+        """Build the context-aware counsellor prompt for a chat message, within the prompt token budget.
 
-Shortlisted Universities: {', '.join(shortlisted_names) if shortlisted_names else 'None'}
-Locked Universities: {', '.join(locked_names) if locked_names else 'None'}
-
-Your role:
+        Open tasks are trimmed first, then the shortlist, then locked universities, then the profile.
+        """
+        builder = PromptBuilder()
+        builder.add(
+            "You are an AI Counsellor helping a student with their study-abroad journey.\n\n"
+            f"Current Stage: {current_stage}",
+            required=True,
+        )
+        builder.add(rendered.profile_text, priority=0)
+        builder.add(
+            f"Locked Universities: {', '.join(rendered.locked) if rendered.locked else 'None'}",
+            priority=1,
+        )
+        builder.add_table("Shortlisted Universities", ("name", "category"), rendered.shortlisted, priority=2)
+        builder.add_table("Open Tasks", ("task", "priority"), rendered.open_todos, priority=3)
+        builder.add(f"""Your role:
 - Guide the student through their study-abroad journey
 - Explain why universities fit or are risky
 - Help with shortlisting decisions
@@ -151,11 +514,34 @@ Your role:
 
 Student's message: {user_message}
 
-Respond as a helpful, knowledgeable counsellor. Be specific, actionable, and supportive.
-"""
+Respond as a helpful, knowledgeable counsellor. Be specific, actionable, and supportive.""", required=True)
+        prompt, tokens = builder.build()
+        self._record_prompt("chat", tokens)
+        return prompt
+    
+    async def chat(
+        self,
+        user_message: str,
+        current_stage: str,
+        db: Session,
+        user_id: int
+    ) -> str:
+        """Handle chat interaction with context awareness; `db` may be a Session or an AsyncSession.
+
+        The session's connection is released before Gemini is called.
+        """
+        rendered = await self._student_context_async(db, user_id)
+        bucket = rendered.bucket + (current_stage,)  # the stage is in the prompt too
+        cached = self.semantic_cache.lookup(user_message, bucket)
+        if cached is not None:
+            return cached
+        context = self._build_chat_prompt(user_message, current_stage, rendered)
+        await release_db(db)
         
         try:
-            return self._generate(context)
+            answer = await self._generate_async(context)
+            self.semantic_cache.store(user_message, bucket, answer)
+            return answer
         except ValueError as e:
             if "RATE_LIMIT:" in str(e):
                 return str(e).replace("RATE_LIMIT:", "").strip()
@@ -163,51 +549,143 @@ Respond as a helpful, knowledgeable counsellor. Be specific, actionable, and sup
         except Exception as e:
             return f"I apologize, but I encountered an error. Please try again. Error: {str(e)}"
     
+    def chat_stream(
+        self,
+        user_message: str,
+        current_stage: str,
+        db: Session,
+        user_id: int
+    ) -> AsyncIterator[str]:
+        """Same as chat, but yields the answer in chunks as Gemini produces it.
+
+        The prompt (and its DB reads) is built up front so the stream itself never touches the session.
+        """
+        rendered = self._student_context(db, user_id)
+        bucket = rendered.bucket + (current_stage,)  # the stage is in the prompt too
+        cached = self.semantic_cache.lookup(user_message, bucket)
+        if cached is not None:
+            return self._replay(cached)
+        context = self._build_chat_prompt(user_message, current_stage, rendered)
+        # The route's session would otherwise keep its connection until the stream ends
+        db.close()
+        return self._stream_reply(context, user_message, bucket)
+    
+    async def _replay(self, answer: str) -> AsyncIterator[str]:
+        yield answer
+    
+    async def _stream_reply(self, prompt: str, user_message: str, bucket: tuple) -> AsyncIterator[str]:
+        try:
+            parts = []
+            async for chunk in self._generate_stream_async(prompt):
+                parts.append(chunk)
+                yield chunk
+            self.semantic_cache.store(user_message, bucket, "".join(parts))
+        except ValueError as e:
+            if "RATE_LIMIT:" in str(e):
+                yield str(e).replace("RATE_LIMIT:", "").strip()
+                return
+            raise
+        except Exception as e:
+            yield f"I apologize, but I encountered an error. Please try again. Error: {str(e)}"
+    
+    def _parse_recommendations(self, text: str, candidates: dict[int, str]) -> list[dict]:
+        """Parse Gemini's JSON answer, keeping only known candidate ids and valid categories"""
+        cleaned = text.strip()
+        if cleaned.startswith("```"):
+            cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", cleaned)
+        data = json.loads(cleaned)
+        if isinstance(data, dict):
+            data = data.get("recommendations", [])
+        if not isinstance(data, list):
+            raise ValueError("Expected a JSON array of recommendations")
+        
+        recommendations = []
+        seen = set()
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            try:
+                university_id = int(item.get("university_id", item.get("id")))
+            except (TypeError, ValueError):
+                continue
+            category = str(item.get("category", "")).strip().lower()
+            if university_id not in candidates or university_id in seen or category not in _CATEGORIES:
+                continue
+            seen.add(university_id)
+            recommendations.append({
+                "university_id": university_id,
+                "name": candidates[university_id],
+                "category": category,
+                "reason": str(item.get("reason") or "").strip(),
+            })
+        return recommendations[:RECOMMEND_MAX_RESULTS]
+    
     async def recommend_universities(
         self,
-        profile: UserProfile,
-        db: Session
+        db: Session,
+        user_id: int
     ) -> list[dict]:
-        """Use AI to recommend universities based on profile"""
-        profile_text = self._format_profile(profile)
+        """Recommend dream/target/safe universities: cheap pre-ranking, then Gemini picks from the top candidates.
+
+        Results are cached by profile + candidate fingerprint, so Gemini is only asked again when
+        the profile (or the catalog it ranks against) changes. If Gemini fails or answers with
+        nothing usable, the heuristic ranking is returned instead (and not cached).
+        """
+        context = load_counsellor_context(db, user_id)
+        if context.profile is None:
+            return []
+        profile_text = self._format_profile(context.profile)
         
-        # Get all universities
-        all_universities = db.query(University).limit(50).all()
-        universities_info = []
-        for uni in all_universities:
-            universities_info.append({
-                "id": uni.id,
-                "name": uni.name,
-                "country": uni.country,
-                "tuition": f"{uni.tuition_min}-{uni.tuition_max}",
-                "acceptance_rate": uni.acceptance_rate,
-                "ranking": uni.ranking
-            })
+        ranked = self.university_service.top_candidates(db, context.profile, RECOMMEND_CANDIDATES)
+        if not ranked:
+            return []
+        candidates = {uni.id: uni.name for _, _, uni in ranked}
+        fallback = [
+            {"university_id": uni.id, "name": uni.name, "category": category, "reason": ""}
+            for _, category, uni in ranked[:RECOMMEND_MAX_RESULTS]
+        ]
         
-        prompt = f"""
-Based on this student profile:
-{profile_text}
-
-And these available universities:
-{json.dumps(universities_info, indent=2)}
-
-Recommend 5-10 universities categorized as:
-- Dream: Reach schools (lower acceptance probability but great fit)
-- Target: Good match schools (realistic acceptance probability)
-- Safe: Backup schools (higher acceptance probability)
-
-For each university, explain:
-1. Why it fits the student
-2. Risk level and acceptance likelihood
-3. Key requirements
+        cache_key = self._fingerprint("recommend", profile_text + "|" + ",".join(map(str, candidates)))
+        if self.response_cache is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return json.loads(cached)
+        
+        rows = [
+            (uni.id, uni.name, uni.country, uni.tuition_max, uni.currency, uni.tuition_max_usd, uni.min_gpa,
+             uni.acceptance_rate, uni.ranking, round(score, 3), category)
+            for score, category, uni in ranked
+        ]
+        builder = PromptBuilder()
+        builder.add(f"Based on this student profile:\n{profile_text.strip()}", required=True)
+        builder.add_table(
+            "Candidate universities (pre-ranked by match score, best first)",
+            ("id", "name", "country", "tuition_max", "currency", "tuition_max_usd", "min_gpa",
+             "acceptance_rate", "ranking", "match_score", "suggested_category"),
+            rows,
+            priority=1,
+            min_rows=10,
+        )
+        builder.add(f"""Recommend 5-{RECOMMEND_MAX_RESULTS} of these universities categorized as:
+- dream: Reach schools (lower acceptance probability but great fit)
+- target: Good match schools (realistic acceptance probability)
+- safe: Backup schools (higher acceptance probability)
 
-Return a JSON array with university IDs and categories.
-"""
+Only use ids from the table. Respond with JSON only, no prose, in this shape:
+[{{"university_id": <id>, "category": "dream"|"target"|"safe", "reason": "<one sentence on fit and risk>"}}]""", required=True)
+        prompt, tokens = builder.build()
+        self._record_prompt("recommend", tokens)
+        await release_db(db)
         
         try:
-            self._generate(prompt)
-            # Parse response and return recommendations (simplified here)
-            return []
-        except Exception:
-            return []
-
+            text = await self._generate_async(prompt, PRIORITY_BACKGROUND, json_mode=True)
+            recommendations = self._parse_recommendations(text, candidates)
+        except Exception as e:
+            log.warning("AI recommendations unavailable, using heuristic ranking: %s", e)
+            return fallback
+        if not recommendations:
+            return fallback
+        
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, json.dumps(recommendations))
+        return recommendations
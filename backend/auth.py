@@ -77,7 +77,13 @@
 #     """Validate Bearer token from Authorization header. Used via Depends() on other routes."""
 #     return get_user_from_request(request, db)
 
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import partial
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -87,7 +93,10 @@ from sqlalchemy.orm import Session
 import os
 from dotenv import load_dotenv
 
-from database import get_db
+from cache import TTLCache
+from database import get_session, run_db
+from db_routing import bind_request_user
+from metrics import password_hash_latency
 from models import User
 
 load_dotenv()
@@ -98,13 +107,26 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Authenticated user snapshots kept in memory so most requests skip the users query; 0 disables
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+# bcrypt cost; existing hashes with a different cost are rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Password hashing runs on this many worker threads; at most PASSWORD_HASH_QUEUE more
+# requests wait for one before login/register answer 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
 
 # ------------------------------------------------------------------
 # PASSWORD HASHING (SINGLE SOURCE OF TRUTH)
 # ------------------------------------------------------------------
 pwd_context = CryptContext(
     schemes=["bcrypt"],
-    deprecated="auto"
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    # min = max = configured cost, so hashes at any other cost "need update"
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
 )
 
 def get_password_hash(password: str) -> str:
@@ -113,6 +135,72 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+class PasswordPoolBusy(Exception):
+    """Every password worker is busy and the wait queue is full."""
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool instead of the event loop.
+
+    bcrypt releases the GIL, so a couple of threads hash in parallel with request
+    handling. Submissions beyond workers + queue are refused (PasswordPoolBusy) rather
+    than queued without bound behind a login burst.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue: int = PASSWORD_HASH_QUEUE):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def _timed(self, operation: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            password_hash_latency.observe(elapsed, operation)
+            with self._lock:
+                self.completed += 1
+                self.total_seconds += elapsed
+
+    async def _submit(self, operation: str, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise PasswordPoolBusy()
+            self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(self._timed, operation, fn, *args))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """(password ok, new hash or None); a new hash means the stored one used another cost."""
+        return await self._submit("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rounds": BCRYPT_ROUNDS,
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_seconds": round(self.total_seconds / self.completed, 4) if self.completed else 0.0,
+            }
+
+password_hasher = PasswordHasher()
+
 # ------------------------------------------------------------------
 # JWT TOKEN
 # ------------------------------------------------------------------
@@ -126,6 +214,49 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def token_claims(user: User) -> dict:
+    """Claims for a user's access token: email as subject plus the user id, so lookups skip the email index"""
+    return {"sub": user.email, "uid": user.id}
+
+# ------------------------------------------------------------------
+# AUTHENTICATED USER CACHE
+# ------------------------------------------------------------------
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Read-only copy of the User fields routes need; what get_current_user returns.
+
+    Routes that change the user load the ORM row with load_user() and call
+    invalidate_user() after committing.
+    """
+    id: int
+    email: str
+    full_name: str
+    is_onboarded: bool
+    current_stage: str
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            is_onboarded=bool(user.is_onboarded),
+            current_stage=user.current_stage,
+        )
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE if USER_CACHE_TTL_SECONDS > 0 else 0, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.invalidate(user_id)
+
+def load_user(db: Session, user: UserSnapshot) -> User:
+    """The ORM User behind a snapshot, for routes that write to it"""
+    db_user = db.get(User, user.id)
+    if db_user is None:
+        invalidate_user(user.id)
+        raise _credentials_exception()
+    return db_user
+
 # ------------------------------------------------------------------
 # AUTH HELPERS
 # ------------------------------------------------------------------
@@ -138,7 +269,8 @@ def _credentials_exception():
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-def get_user_from_request(request: Request, db: Session) -> User:
+def _token_claims(request: Request) -> tuple[str, Optional[int]]:
+    """(email, user id or None) from the request's Bearer token; raises 401."""
     auth = request.headers.get("Authorization")
     if not auth or not auth.startswith("Bearer "):
         raise _credentials_exception()
@@ -155,14 +287,45 @@ def get_user_from_request(request: Request, db: Session) -> User:
     except JWTError:
         raise _credentials_exception()
 
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
+    user_id = payload.get("uid")
+    return email, user_id if isinstance(user_id, int) else None
+
+def _cached_user(email: str, user_id: Optional[int]) -> Optional[UserSnapshot]:
+    if user_id is None:
+        return None
+    cached = user_cache.get(user_id)
+    return cached if cached is not None and cached.email == email else None
+
+def _load_user_snapshot(db: Session, email: str, user_id: Optional[int]) -> UserSnapshot:
+    # Tokens issued before the uid claim existed fall back to the email lookup
+    if user_id is not None:
+        user = db.get(User, user_id)
+    else:
+        user = db.query(User).filter(User.email == email).first()
+    if not user or user.email != email:
         raise _credentials_exception()
 
-    return user
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.set(user.id, snapshot)
+    bind_request_user(user.id)
+    return snapshot
+
+def get_user_from_request(request: Request, db: Session) -> UserSnapshot:
+    email, user_id = _token_claims(request)
+    bind_request_user(user_id)
+    cached = _cached_user(email, user_id)
+    if cached is not None:
+        return cached
+    return _load_user_snapshot(db, email, user_id)
 
 async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db),
-) -> User:
-    return get_user_from_request(request, db)
+    db=Depends(get_session),
+) -> UserSnapshot:
+    """Authenticated user; cache hits skip the database, misses use the DB_MODE session"""
+    email, user_id = _token_claims(request)
+    bind_request_user(user_id)
+    cached = _cached_user(email, user_id)
+    if cached is not None:
+        return cached
+    return await run_db(db, _load_user_snapshot, email, user_id)
@@ -0,0 +1,124 @@
+"""
+Authenticated request throughput benchmark.
+
+Registers a throwaway user, logs in, then hits an authenticated endpoint from
+concurrent clients for a fixed time and reports requests/s, latency and (in-process)
+SQL statements per request.
+
+    python bench.py                          # in-process, user cache off vs on
+    python bench.py --path /api/universities/shortlisted --concurrency 4
+    python bench.py --compare-db-modes --concurrency 64   # DB_MODE=sync vs async
+    python bench.py --url http://localhost:8000 --duration 20
+
+In-process runs use DATABASE_URL like the app does; point it at a scratch database.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+
+async def _login(client: httpx.AsyncClient) -> str:
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    password = "bench-password"
+    r = await client.post("/api/auth/register", json={"email": email, "password": password, "full_name": "Bench User"})
+    r.raise_for_status()
+    r = await client.post("/api/auth/login", data={"username": email, "password": password})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def _run(client: httpx.AsyncClient, path: str, token: str, concurrency: int, duration: float) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            r = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if r.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def bench_remote(args) -> None:
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        token = await _login(client)
+        print(args.path, await _run(client, args.path, token, args.concurrency, args.duration))
+
+
+async def bench_in_process(args) -> None:
+    from sqlalchemy import event
+
+    import auth
+    from database import DB_MODE, Base, async_engine, engine
+    from main import app
+
+    Base.metadata.create_all(bind=engine)
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    maxsize = auth.user_cache.maxsize
+    runs = (("user cache off", 0), ("user cache on", maxsize or 10000))
+    if args.cache == "on":
+        runs = runs[1:]
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=30) as client:
+        token = await _login(client)
+        for label, cache_size in runs:
+            auth.user_cache.clear()
+            auth.user_cache.maxsize = cache_size
+            statements = 0
+            result = await _run(client, args.path, token, args.concurrency, args.duration)
+            result["sql_per_request"] = round(statements / max(1, result["requests"]), 2)
+            print(f"DB_MODE={DB_MODE:5} {label:15} {args.path} {result}")
+    auth.user_cache.maxsize = maxsize
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--path", default="/api/todos", help="authenticated GET endpoint to hit")
+    parser.add_argument("--concurrency", type=int, default=8, help="keep below the DB pool size with DB_MODE=sync")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--cache", choices=("compare", "on"), default="compare", help="user cache runs (in-process)")
+    parser.add_argument("--compare-db-modes", action="store_true",
+                        help="run the in-process benchmark under DB_MODE=sync and DB_MODE=async")
+    args = parser.parse_args()
+    if args.compare_db_modes:
+        # DB_MODE is read at import time, so each mode runs in its own interpreter
+        argv = [a for a in sys.argv[1:] if a != "--compare-db-modes"] + ["--cache", "on"]
+        for mode in ("sync", "async"):
+            subprocess.run([sys.executable, __file__, *argv], env={**os.environ, "DB_MODE": mode}, check=False)
+        return
+    asyncio.run(bench_remote(args) if args.url else bench_in_process(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import CatalogVersion, University, UniversityProgram
+from programs import program_key
+from schemas import UniversityResponse
+
+# The catalog is reference data that only changes when seed_universities.py, fx_rates.py
+# (or an admin) writes it. Writers call bump_catalog_version(db), which bumps the shared
+# catalog_version row; every process compares that row (plus count/max(id), for writes
+# that skip it) at most this often and reloads when it moved.
+CATALOG_CHECK_SECONDS = float(os.getenv("CATALOG_CHECK_SECONDS", "300"))
+
+
+def _column(values) -> np.ndarray:
+    """float64 column with NaN for NULL, so comparisons behave like SQL (NULL never matches)."""
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+class CatalogIndex:
+    """Column-oriented, read-only snapshot of the universities table.
+
+    Row i of every array describes responses[i]; rows are in id order.
+    """
+
+    def __init__(self, universities: list[University], version: tuple, programs: list[tuple[int, str]] = ()):
+        self.version = version
+        self.responses = [UniversityResponse.model_validate(u) for u in universities]
+        self.ids = np.array([u.id for u in universities], dtype=np.int64)
+        self.countries = [(u.country or "").lower() for u in universities]
+        # Tuition in USD (fx_rates.py), so budgets compare across currencies
+        self.tuition_min_usd = _column(u.tuition_min_usd for u in universities)
+        self.tuition_max_usd = _column(u.tuition_max_usd for u in universities)
+        self.min_gpa = _column(u.min_gpa for u in universities)
+        self.ranking = _column(u.ranking for u in universities)
+        self.acceptance_rate = _column(u.acceptance_rate for u in universities)
+        self.position_by_id = {int(uid): pos for pos, uid in enumerate(self.ids)}
+
+        by_country: dict[str, list[int]] = {}
+        for pos, country in enumerate(self.countries):
+            by_country.setdefault(country, []).append(pos)
+        self.by_country = {c: np.array(p, dtype=np.int64) for c, p in by_country.items()}
+
+        # program key -> positions of the universities offering it (from university_programs)
+        by_program: dict[str, list[int]] = {}
+        for university_id, key in programs:
+            pos = self.position_by_id.get(university_id)
+            if pos is not None:
+                by_program.setdefault(key, []).append(pos)
+        self.by_program = {k: np.array(sorted(p), dtype=np.int64) for k, p in by_program.items()}
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def country_mask(self, country: str) -> np.ndarray:
+        """Rows whose country contains `country`, case-insensitively (same as ILIKE '%country%')."""
+        needle = country.lower()
+        mask = np.zeros(len(self), dtype=bool)
+        for name, positions in self.by_country.items():
+            if needle in name:
+                mask[positions] = True
+        return mask
+
+    def program_mask(self, program: str) -> np.ndarray:
+        """Rows offering `program` (matched on the normalized program key)."""
+        mask = np.zeros(len(self), dtype=bool)
+        positions = self.by_program.get(program_key(program))
+        if positions is not None:
+            mask[positions] = True
+        return mask
+
+    def filter_mask(
+        self,
+        gpa: Optional[float] = None,
+        country: Optional[str] = None,
+        budget_min: Optional[float] = None,
+        budget_max: Optional[float] = None,
+        profile_budget_min: Optional[float] = None,
+        profile_budget_max: Optional[float] = None,
+        program: Optional[str] = None,
+    ) -> np.ndarray:
+        """Boolean row mask with the same semantics as UniversityService's SQL filters.
+
+        Budgets are in USD.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if country:
+            mask &= self.country_mask(country)
+        if program:
+            mask &= self.program_mask(program)
+        if budget_min is not None:
+            mask &= self.tuition_max_usd >= budget_min
+        if budget_max is not None:
+            mask &= self.tuition_min_usd <= budget_max
+        if budget_min is None and budget_max is None:
+            if profile_budget_max:
+                mask &= self.tuition_max_usd <= profile_budget_max
+            if profile_budget_min:
+                mask &= self.tuition_min_usd >= profile_budget_min
+        if gpa:
+            mask &= np.isnan(self.min_gpa) | (self.min_gpa <= gpa)
+        return mask
+
+
+_lock = threading.Lock()
+_index: Optional[CatalogIndex] = None
+_local_version = 0
+_checked_at = 0.0
+
+
+def bump_catalog_version(db: Optional[Session] = None) -> None:
+    """Mark the catalog stale: this process reloads on the next get_catalog().
+
+    With `db`, the shared catalog_version row is bumped in db's transaction (the caller
+    commits), so other processes and servers reload within CATALOG_CHECK_SECONDS.
+    """
+    global _local_version
+    with _lock:
+        _local_version += 1
+    if db is not None:
+        bumped = (
+            db.query(CatalogVersion)
+            .filter(CatalogVersion.id == 1)
+            .update({CatalogVersion.version: CatalogVersion.version + 1}, synchronize_session=False)
+        )
+        if not bumped:
+            db.add(CatalogVersion(id=1, version=1))
+
+
+def _db_version(db: Session) -> tuple:
+    stored = select(CatalogVersion.version).where(CatalogVersion.id == 1).scalar_subquery()
+    count, max_id, version = db.query(func.count(University.id), func.max(University.id), stored).one()
+    return (count, max_id, version or 0)
+
+
+def get_catalog(db: Session) -> CatalogIndex:
+    """Current catalog index, loading it on first use and after a version change.
+
+    The database is read without holding _lock: with DB_MODE=async this runs on the event
+    loop thread (AsyncSession.run_sync), where blocking on a lock held by a request that
+    is itself waiting on the database would stall the worker. Concurrent cold loads may
+    each build an index; the lock only guards swapping the result in.
+    """
+    global _index, _checked_at
+    now = time.monotonic()
+    index = _index
+    if index is not None and index.version[0] == _local_version and now - _checked_at < CATALOG_CHECK_SECONDS:
+        return index
+    version = (_local_version, _db_version(db))
+    if index is None or index.version != version:
+        universities = db.query(University).order_by(University.id).all()
+        programs = db.query(UniversityProgram.university_id, UniversityProgram.name_key).all()
+        index = CatalogIndex(universities, version, programs)
+    with _lock:
+        # Don't replace an index built after a later local bump
+        if _index is None or _index.version[0] <= version[0]:
+            _index = index
+        _checked_at = now
+        return _index
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from typing import Optional
+
+# How long a model is skipped after Gemini says it is over quota (429) or gone (404).
+# Repeated rate limits double the cooldown, up to the max.
+RATE_LIMIT_COOLDOWN_SECONDS = float(os.getenv("GEMINI_RATE_LIMIT_COOLDOWN_SECONDS", "60"))
+RATE_LIMIT_MAX_COOLDOWN_SECONDS = float(os.getenv("GEMINI_RATE_LIMIT_MAX_COOLDOWN_SECONDS", "600"))
+NOT_FOUND_COOLDOWN_SECONDS = float(os.getenv("GEMINI_NOT_FOUND_COOLDOWN_SECONDS", "3600"))
+# After a cooldown one probe request tests the model; a probe that never reports back
+# (crashed worker, cancelled request) stops blocking the next probe after this long
+PROBE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_PROBE_TIMEOUT_SECONDS", "120"))
+# Cap on the doubling, far past any useful cooldown, so 2 ** n never overflows a float
+_MAX_BACKOFF_EXPONENT = 32
+
+RATE_LIMITED = "rate_limited"
+NOT_FOUND = "not_found"
+
+
+class _ModelState:
+    __slots__ = (
+        "open_until", "reason", "probing", "probe_started", "consecutive_failures", "failures", "successes", "last_error",
+    )
+
+    def __init__(self):
+        self.open_until = 0.0
+        self.reason: Optional[str] = None  # None = closed; set = open, or half-open once open_until passes
+        self.probing = False
+        self.probe_started = 0.0
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.successes = 0
+        self.last_error: Optional[str] = None
+
+
+class ModelCircuitBreaker:
+    """Per-model breaker: remembers which Gemini models are rate-limited or missing.
+
+    closed -> open on a 404/429; once the cooldown is over the model is half-open and
+    exactly one request (the probe) may try it. Success closes the breaker, failure
+    reopens it with a longer cooldown. Shared by all requests; it only decides which
+    models a request tries, never which model another request uses.
+    """
+
+    def __init__(
+        self,
+        rate_limit_cooldown: float = RATE_LIMIT_COOLDOWN_SECONDS,
+        rate_limit_max_cooldown: float = RATE_LIMIT_MAX_COOLDOWN_SECONDS,
+        not_found_cooldown: float = NOT_FOUND_COOLDOWN_SECONDS,
+        probe_timeout: float = PROBE_TIMEOUT_SECONDS,
+    ):
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.rate_limit_max_cooldown = rate_limit_max_cooldown
+        self.not_found_cooldown = not_found_cooldown
+        self.probe_timeout = probe_timeout
+        self._states: dict[str, _ModelState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, model: str) -> _ModelState:
+        state = self._states.get(model)
+        if state is None:
+            state = self._states[model] = _ModelState()
+        return state
+
+    def _available(self, state: _ModelState, now: float) -> bool:
+        if state.open_until > now:
+            return False
+        if state.reason is None:
+            return True
+        return not state.probing or now - state.probe_started > self.probe_timeout
+
+    def candidates(self, models: list[str]) -> list[str]:
+        """Models worth trying, in preference order: closed ones, and half-open ones whose
+        probe is not taken yet. Empty while every model is cooling down.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [m for m in models if self._available(self._state(m), now)]
+
+    def allow(self, model: str) -> Optional[bool]:
+        """Claim a call on `model` right before making it.
+
+        None: don't call it (open, or another request is probing). False: normal call on
+        a closed breaker. True: this call is the half-open probe; report the result with
+        record_success / record_failure, or end_probe() if the call never happened.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(model)
+            if not self._available(state, now):
+                return None
+            if state.reason is None:
+                return False
+            state.probing = True
+            state.probe_started = now
+            return True
+
+    def end_probe(self, model: str) -> None:
+        with self._lock:
+            self._state(model).probing = False
+
+    def record_success(self, model: str) -> None:
+        with self._lock:
+            state = self._state(model)
+            state.successes += 1
+            state.probing = False
+            state.consecutive_failures = 0
+            state.open_until = 0.0
+            state.reason = None
+
+    def record_failure(self, model: str, reason: str, error: Exception) -> None:
+        with self._lock:
+            state = self._state(model)
+            state.failures += 1
+            state.probing = False
+            state.consecutive_failures += 1
+            state.reason = reason
+            state.last_error = str(error)[:200]
+            if reason == NOT_FOUND:
+                cooldown = self.not_found_cooldown
+            else:
+                exponent = min(state.consecutive_failures - 1, _MAX_BACKOFF_EXPONENT)
+                cooldown = min(self.rate_limit_cooldown * 2 ** exponent, self.rate_limit_max_cooldown)
+            state.open_until = time.monotonic() + cooldown
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model: {
+                    "state": "open" if state.open_until > now else ("half_open" if state.reason else "closed"),
+                    "probing": state.probing,
+                    "reason": state.reason,
+                    "retry_in_seconds": round(max(0.0, state.open_until - now), 1),
+                    "consecutive_failures": state.consecutive_failures,
+                    "failures": state.failures,
+                    "successes": state.successes,
+                    "last_error": state.last_error,
+                }
+                for model, state in self._states.items()
+            }
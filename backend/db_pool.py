@@ -0,0 +1,125 @@
+"""
+Connection pool settings from the environment, and pools that time their checkouts.
+
+    DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT / DB_POOL_RECYCLE
+    DB_POOL_PRE_PING   true: test each connection on checkout (one extra round trip);
+                       false: rely on DB_POOL_RECYCLE and reconnect on the next request
+    DB_PGBOUNCER       true: no client-side pool (PgBouncer pools), no pre-ping (each
+                       checkout is a fresh connection) and no prepared statements,
+                       which transaction-mode PgBouncer cannot route
+
+Checkout waits are exported as the db_pool_checkout_wait_seconds histogram.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from metrics import db_pool_checkout_wait
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").strip().lower() in ("1", "true", "yes")
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").strip().lower() in ("1", "true", "yes")
+
+
+class _TimedCheckout:
+    """Pool mixin: records how long each checkout waited and how many timed out."""
+
+    # Engine name for the histogram; set by label_pool() and carried over by recreate()
+    label = "unlabelled"
+
+    def _checkout_stats(self) -> dict:
+        stats = self.__dict__.get("_timing")
+        if stats is None:
+            stats = self.__dict__.setdefault("_timing", {
+                "lock": threading.Lock(), "checkouts": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0,
+            })
+        return stats
+
+    def _do_get(self):
+        stats = self._checkout_stats()
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            with stats["lock"]:
+                stats["timeouts"] += 1
+            raise
+        waited = time.perf_counter() - start
+        db_pool_checkout_wait.observe(waited, self.label)
+        with stats["lock"]:
+            stats["checkouts"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+        return conn
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+    def telemetry(self) -> dict:
+        stats = self._checkout_stats()
+        with stats["lock"]:
+            checkouts = stats["checkouts"]
+            return {
+                "size": self.size(),
+                "in_use": self.checkedout(),
+                "idle": self.checkedin(),
+                "overflow": max(0, self.overflow()),
+                "max_overflow": self._max_overflow,
+                "checkouts": checkouts,
+                "timeouts": stats["timeouts"],
+                "avg_checkout_wait_ms": round(stats["wait_total"] / checkouts * 1000, 3) if checkouts else 0.0,
+                "max_checkout_wait_ms": round(stats["wait_max"] * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """create_engine / create_async_engine keyword arguments for `url` from the DB_* settings."""
+    if url.startswith("sqlite") and (is_async or ":memory:" in url or url.rstrip("/").endswith(":")):
+        # Keep SQLAlchemy's defaults: a single connection for in-memory SQLite, and no pooling for
+        # aiosqlite (a pooled aiosqlite connection keeps its worker thread, and the process, alive)
+        return {}
+    if DB_PGBOUNCER:
+        # Every checkout opens a new connection to PgBouncer, so there is nothing stale to ping
+        options = {"poolclass": NullPool}
+        if is_async and "asyncpg" in url:
+            # asyncpg prepares every statement; PgBouncer (transaction mode) can't route those
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+    return dict(
+        pool_pre_ping=DB_POOL_PRE_PING,
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+
+def label_pool(engine, name: str) -> None:
+    """Name `engine`'s pool in the checkout-wait histogram."""
+    if isinstance(engine.pool, _TimedCheckout):
+        engine.pool.label = name
+
+
+def pool_telemetry(engine) -> dict:
+    """Checkout and occupancy figures for an engine's pool (or the pool's status line)."""
+    pool = engine.pool
+    if isinstance(pool, _TimedCheckout):
+        return pool.telemetry()
+    return {"pool": type(pool).__name__, "status": pool.status()}
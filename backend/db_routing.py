@@ -0,0 +1,156 @@
+"""
+Read-replica routing for ORM sessions.
+
+With DATABASE_REPLICA_URL set, RoutingSession sends plain SELECTs to the replica and
+everything else (flushes, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE, raw text SQL)
+to the primary. Once a session has written, it stays on the primary.
+
+Read-your-writes: a client that committed a write in the last REPLICA_STICKY_SECONDS reads
+from the primary, so a new shortlist or todo shows up even while the replica lags. The
+window travels with the client: a response to a request that wrote carries
+X-Primary-Until (epoch seconds), and requests echoing it back before then read from the
+primary on whichever process serves them. Each process also remembers its own recent
+writers, for clients that don't echo the header. Set the window above the replica's
+typical lag.
+"""
+import contextvars
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_STICKY_HEADER = "X-Primary-Until"
+# Tolerated clock difference between the process that set the header and the one reading it
+_CLOCK_SLACK_SECONDS = 1.0
+
+# The authenticated user of the current request; set by auth once the token is decoded
+_request_user: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("request_user", default=None)
+# user id -> True while that user's last commit is inside the sticky window
+recent_writers = TTLCache(maxsize=100_000, ttl=REPLICA_STICKY_SECONDS)
+
+
+class _RequestWindow:
+    """The current request's sticky window: the client's deadline in, whether it wrote out."""
+
+    __slots__ = ("primary_until", "wrote")
+
+    def __init__(self, primary_until: float = 0.0):
+        self.primary_until = primary_until
+        self.wrote = False
+
+
+_request_window: contextvars.ContextVar[Optional[_RequestWindow]] = contextvars.ContextVar(
+    "request_window", default=None
+)
+
+
+def bind_request_user(user_id: Optional[int]) -> None:
+    """Tie the current request's sessions to `user_id` for read-your-writes routing."""
+    _request_user.set(user_id)
+
+
+def record_write(user_id: int) -> None:
+    """Start `user_id`'s sticky window by hand, for writes made before a user is bound (registration)."""
+    recent_writers.set(user_id, True)
+
+
+def use_primary(db) -> None:
+    """Send every query of this session (sync or async) to the primary, e.g. for login."""
+    getattr(db, "sync_session", db).info["primary"] = True
+
+
+def reads_from_primary() -> bool:
+    """True when the current request's client or user wrote within the sticky window."""
+    window = _request_window.get()
+    if window is not None and window.primary_until > time.time():
+        return True
+    user_id = _request_user.get()
+    return user_id is not None and recent_writers.get(user_id) is not None
+
+
+def _is_replica_read(clause) -> bool:
+    return getattr(clause, "is_select", False) and getattr(clause, "_for_update_arg", None) is None
+
+
+class RoutingSession(Session):
+    """Session bound to the primary that serves plain reads from `replica` when one is given."""
+
+    def __init__(self, *args, replica=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = replica
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is not None:
+            if getattr(clause, "is_dml", False):
+                self.info["wrote"] = True
+            elif (
+                not (self._flushing or self.info.get("wrote") or self.info.get("primary"))
+                and _is_replica_read(clause)
+                and not reads_from_primary()
+            ):
+                return self.replica
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    if session.info.pop("wrote", False):
+        window = _request_window.get()
+        if window is not None:
+            window.wrote = True
+        user_id = _request_user.get()
+        if user_id is not None:
+            record_write(user_id)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("wrote", None)
+
+
+def _client_deadline(raw: Optional[bytes]) -> float:
+    """The X-Primary-Until value if it is a deadline this server could have issued, else 0."""
+    try:
+        until = float(raw) if raw else 0.0
+    except ValueError:
+        return 0.0
+    now = time.time()
+    return until if now < until <= now + REPLICA_STICKY_SECONDS + _CLOCK_SLACK_SECONDS else 0.0
+
+
+class ReadYourWritesMiddleware:
+    """Carries the sticky window through the client: honours X-Primary-Until on the way in
+    and sets it on responses to requests that committed a write."""
+
+    def __init__(self, app):
+        self.app = app
+        self.header = REPLICA_STICKY_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        raw = next((v for k, v in scope["headers"] if k == self.header), None)
+        window = _RequestWindow(_client_deadline(raw))
+
+        async def send_with_window(message):
+            if message["type"] == "http.response.start" and window.wrote:
+                until = f"{time.time() + REPLICA_STICKY_SECONDS:.3f}".encode("latin-1")
+                message["headers"] = list(message.get("headers", [])) + [(self.header, until)]
+            await send(message)
+
+        token = _request_window.set(window)
+        try:
+            await self.app(scope, receive, send_with_window)
+        finally:
+            _request_window.reset(token)
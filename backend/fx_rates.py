@@ -0,0 +1,198 @@
+"""
+Local FX table and the USD-normalized tuition columns on universities.
+
+Tuition in the seed data is in each university's local currency, so budget filters and
+match scores compare against tuition_min_usd / tuition_max_usd / living_cost_usd instead.
+Refresh those columns after changing rates (or on an existing database):
+
+    python fx_rates.py
+
+Running servers pick the new values up within CATALOG_CHECK_SECONDS (catalog_index.py).
+"""
+import json
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy import func, inspect, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from catalog_index import bump_catalog_version
+from models import University
+
+log = logging.getLogger("uvicorn.error")
+
+# Optional JSON file {"EUR": 1.08, ...} (USD per unit) that overrides the built-in table
+FX_RATES_PATH = os.getenv("FX_RATES_PATH", "")
+
+# USD per one unit of currency; approximate mid-2024 rates, fine for budget matching
+USD_PER_UNIT = {
+    "USD": 1.0,
+    "EUR": 1.08,
+    "GBP": 1.27,
+    "CHF": 1.12,
+    "CAD": 0.73,
+    "AUD": 0.66,
+    "NZD": 0.61,
+    "SGD": 0.74,
+    "HKD": 0.128,
+    "JPY": 0.0066,
+    "KRW": 0.00073,
+    "CNY": 0.138,
+    "TWD": 0.031,
+    "MYR": 0.213,
+    "THB": 0.028,
+    "IDR": 0.000062,
+    "PHP": 0.0172,
+    "VND": 0.0000393,
+    "INR": 0.012,
+    "PKR": 0.0036,
+    "BDT": 0.0085,
+    "LKR": 0.0033,
+    "NPR": 0.0075,
+    "KZT": 0.0022,
+    "SEK": 0.095,
+    "NOK": 0.094,
+    "DKK": 0.145,
+    "PLN": 0.25,
+    "CZK": 0.044,
+    "HUF": 0.0028,
+    "RUB": 0.011,
+    "UAH": 0.025,
+    "TRY": 0.031,
+    "ILS": 0.27,
+    "AED": 0.2723,
+    "SAR": 0.2667,
+    "QAR": 0.2747,
+    "KWD": 3.26,
+    "BHD": 2.65,
+    "OMR": 2.6,
+    "JOD": 1.41,
+    "LBP": 0.0000112,
+    "IRR": 0.0000238,
+    "BRL": 0.19,
+    "MXN": 0.058,
+    "ARS": 0.0011,
+    "CLP": 0.00108,
+    "COP": 0.00025,
+    "PEN": 0.27,
+    "UYU": 0.025,
+    "CRC": 0.0019,
+    "ZAR": 0.054,
+    "EGP": 0.021,
+    "NGN": 0.00068,
+    "KES": 0.0077,
+    "GHS": 0.068,
+    "MAD": 0.1,
+    "TZS": 0.00038,
+    "UGX": 0.00027,
+    "ETB": 0.0174,
+    "DZD": 0.0074,
+    "TND": 0.32,
+}
+
+if FX_RATES_PATH:
+    with open(FX_RATES_PATH, encoding="utf-8") as f:
+        USD_PER_UNIT.update({code.upper(): float(rate) for code, rate in json.load(f).items()})
+
+# (column, source attribute) pairs kept in sync by refresh_usd_columns()
+USD_COLUMNS = (
+    ("tuition_min_usd", "tuition_min"),
+    ("tuition_max_usd", "tuition_max"),
+    ("living_cost_usd", "living_cost_estimate"),
+)
+
+
+def to_usd(amount: Optional[float], currency: Optional[str]) -> Optional[float]:
+    """`amount` in USD, or None when the amount is missing or the currency is unknown."""
+    if amount is None:
+        return None
+    rate = USD_PER_UNIT.get((currency or "USD").upper())
+    if rate is None:
+        return None
+    return round(float(amount) * rate, 2)
+
+
+def budget_usd(profile, value: Optional[float] = None) -> Optional[float]:
+    """A budget figure in the profile's currency (USD when there is no profile) converted to USD.
+
+    Unknown profile currencies are treated as USD, which is what every budget was before.
+    """
+    if value is None:
+        return None
+    currency = (getattr(profile, "currency", None) if profile is not None else None) or "USD"
+    rate = USD_PER_UNIT.get(currency.upper(), 1.0)
+    return round(float(value) * rate, 2)
+
+
+def usd_values(university) -> dict:
+    """USD column values for a University (or a dict of its fields)."""
+    get = university.get if isinstance(university, dict) else lambda k: getattr(university, k, None)
+    currency = get("currency")
+    return {column: to_usd(get(source), currency) for column, source in USD_COLUMNS}
+
+
+def ensure_usd_columns(engine: Engine) -> bool:
+    """Add the USD columns and their indexes to an existing universities table.
+
+    create_all() never alters tables, so databases created before these columns existed
+    are patched here. Returns True if anything was added.
+    """
+    existing = {c["name"] for c in inspect(engine).get_columns("universities")}
+    missing = [column for column, _ in USD_COLUMNS if column not in existing]
+    if not missing:
+        return False
+    with engine.begin() as conn:
+        for column in missing:
+            conn.execute(text(f"ALTER TABLE universities ADD COLUMN {column} FLOAT"))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_universities_{column} ON universities ({column})"))
+    log.info("added universities columns: %s", ", ".join(missing))
+    return True
+
+
+def usd_columns_missing(db: Session) -> bool:
+    """True when a university in a currency with a known rate has an amount but no USD value.
+
+    That is the state of columns just added by a migration (which cannot fill them in
+    from this module's rates at upgrade time on every deployment) or by hand.
+    """
+    missing = or_(*(
+        (getattr(University, source).isnot(None)) & (getattr(University, column).is_(None))
+        for column, source in USD_COLUMNS
+    ))
+    known = func.upper(func.coalesce(University.currency, "USD")).in_(list(USD_PER_UNIT))
+    return db.query(University.id).filter(missing, known).first() is not None
+
+
+def refresh_usd_columns(db: Session) -> int:
+    """Recompute the USD columns for every university from the current rates; returns rows changed."""
+    changed = 0
+    unknown = set()
+    for uni in db.query(University).all():
+        if (uni.currency or "USD").upper() not in USD_PER_UNIT:
+            unknown.add(uni.currency)
+        values = usd_values(uni)
+        if any(getattr(uni, column) != value for column, value in values.items()):
+            for column, value in values.items():
+                setattr(uni, column, value)
+            changed += 1
+    if changed:
+        bump_catalog_version(db)
+    db.commit()
+    if unknown:
+        log.warning("no FX rate for %s; those universities have no USD tuition", ", ".join(sorted(map(str, unknown))))
+    return changed
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+    from models import CatalogVersion
+
+    ensure_usd_columns(engine)
+    CatalogVersion.__table__.create(engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        print(f"Updated {refresh_usd_columns(db)} universities from {len(USD_PER_UNIT)} rates.")
+    finally:
+        db.close()
@@ -455,35 +455,51 @@
 #     uvicorn.run("main:app", host="0.0.0.0", port=port)
 
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from contextlib import asynccontextmanager
 import os
+import json
+import logging
 import threading
 from dotenv import load_dotenv
-import traceback
 
-from database import get_db, engine, Base
+from database import DATABASE_REPLICA_URL, engines, get_db, get_session, pool_stats, run_db, engine, Base, SessionLocal
+from db_routing import REPLICA_STICKY_HEADER, ReadYourWritesMiddleware, record_write, recent_writers, use_primary
 from models import User, UserProfile, University, ShortlistedUniversity, LockedUniversity, TodoTask
 from schemas import (
     UserCreate, UserResponse, Token,
     ProfileCreate, ProfileResponse,
-    UniversityResponse, UniversityShortlist, UniversityLock,
+    UniversityResponse, UniversityShortlist, UniversityLock, UniversityListResponse, UniversityPage,
     TodoCreate, TodoResponse, TodoUpdate
 )
 from auth import (
+    UserSnapshot,
     get_current_user,
     get_user_from_request,
     create_access_token,
-    verify_password,
-    get_password_hash
+    invalidate_user,
+    load_user,
+    password_hasher,
+    PasswordPoolBusy,
+    token_claims,
+    user_cache,
 )
 from ai_counsellor import AICounsellor
-from university_service import UniversityService
+import metrics
+import query_stats
+from catalog_index import bump_catalog_version
+from fx_rates import ensure_usd_columns, refresh_usd_columns, usd_columns_missing
+from programs import backfill_programs, programs_missing
+from university_service import InvalidCursor, UniversityService
+from university_search import search_universities
 
 load_dotenv()
+log = logging.getLogger("uvicorn.error")
 
 # --------------------------------------------------
 # DATABASE INIT (SAFE FOR RAILWAY)
@@ -497,8 +513,19 @@ load_dotenv()
 def _ensure_tables_async():
     try:
         Base.metadata.create_all(bind=engine)
+        db = SessionLocal()
+        try:
+            # New columns, or columns a migration added without values
+            if ensure_usd_columns(engine) or usd_columns_missing(db):
+                refresh_usd_columns(db)
+            if programs_missing(db):
+                backfill_programs(db)
+                bump_catalog_version(db)
+                db.commit()
+        finally:
+            db.close()
     except Exception as e:
-        print("DB init skipped:", e)
+        log.warning("DB init skipped: %s", e)
 
 # --------------------------------------------------
 # LIFESPAN (REPLACES on_event)
@@ -537,7 +564,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REPLICA_STICKY_HEADER],
 )
+if DATABASE_REPLICA_URL:
+    # Read-your-writes across processes: the client echoes X-Primary-Until after it writes
+    app.add_middleware(ReadYourWritesMiddleware)
+# Outermost, so latency includes CORS handling; exposed at /metrics. QueryStatsMiddleware
+# wraps it so the per-request SQL counts are still open when metrics reads them.
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(query_stats.QueryStatsMiddleware)
+for _engine in engines().values():
+    query_stats.instrument_engine(_engine)
+
+
+def _collect_pool_metrics():
+    for name, stats in pool_stats().items():
+        if "in_use" not in stats:
+            continue  # NullPool / SQLite default pools have no figures to export
+        for state in ("in_use", "idle", "overflow"):
+            metrics.db_pool_connections.set(name, state, value=stats[state])
+        metrics.db_pool_checkouts.set(name, value=stats["checkouts"])
+        metrics.db_pool_timeouts.set(name, value=stats["timeouts"])
+
+
+metrics.register_collector(_collect_pool_metrics)
 
 # ✅ FORCE PREFLIGHT TO ALWAYS SUCCEED
 
@@ -561,22 +611,62 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/api/diagnostics")
+async def diagnostics():
+    return {
+        "context_cache": ai_counsellor.context_cache.stats(),
+        "response_cache": (
+            ai_counsellor.response_cache.stats() if ai_counsellor.response_cache is not None else None
+        ),
+        "semantic_cache": ai_counsellor.semantic_cache.stats(),
+        "model_breakers": ai_counsellor.breaker.snapshot(),
+        "rate_limiter": ai_counsellor.limiter.stats(),
+        "prompts": ai_counsellor.prompt_stats.snapshot(),
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "db_pool": pool_stats(),
+        "replica_sticky_users": recent_writers.stats() if DATABASE_REPLICA_URL else None,
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # --------------------------------------------------
 # AUTH ROUTES
 # --------------------------------------------------
+def _password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-ins right now, please retry shortly",
+        headers={"Retry-After": "2"},
+    )
+
+# Sync query helpers for routes on get_session; run them with run_db() so they work in either DB_MODE
+def _user_by_email(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+def _save(db: Session, row):
+    """Add, commit and refresh one row"""
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    return row
+
+def _profile(db: Session, user_id: int):
+    return db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+
 @app.post("/api/auth/register", response_model=UserResponse, status_code=201)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db=Depends(get_session)):
     try:
-        print("➡️ REGISTER CALLED:", user_data)
-
-        existing = db.query(User).filter(User.email == user_data.email).first()
-        print("➡️ EXISTING USER:", existing)
+        use_primary(db)  # a replica lagging behind a just-finished signup would let the email through twice
+        existing = await run_db(db, _user_by_email, user_data.email)
 
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
 
-        hashed = get_password_hash(user_data.password)
-        print("➡️ PASSWORD HASHED")
+        hashed = await password_hasher.hash(user_data.password)
 
         user = User(
             email=user_data.email,
@@ -584,11 +674,10 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             hashed_password=hashed,
         )
 
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+        user = await run_db(db, _save, user)
 
-        print("➡️ USER CREATED:", user.id)
+        log.info("registered user %d", user.id)
+        record_write(user.id)  # their first authenticated requests read from the primary
 
         return UserResponse(
             id=user.id,
@@ -598,24 +687,38 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             current_stage=user.current_stage,
         )
 
+    except HTTPException:
+        raise
+    except PasswordPoolBusy:
+        raise _password_pool_busy()
     except Exception as e:
-        print("🔥 REGISTER ERROR:", e)
-        traceback.print_exc()
+        log.exception("register failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/auth/login", response_model=Token)
-async def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form.username).first()
-    if not user or not verify_password(form.password, user.hashed_password):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db=Depends(get_session)):
+    use_primary(db)
+    user = await run_db(db, _user_by_email, form.username)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(form.password, user.hashed_password)
+    except PasswordPoolBusy:
+        raise _password_pool_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Stored hash used a different BCRYPT_ROUNDS; upgrade it while we have the password
+        user.hashed_password = new_hash
+        await run_db(db, Session.commit)
 
-    token = create_access_token({"sub": user.email})
+    token = create_access_token(token_claims(user))
     return {"access_token": token, "token_type": "bearer"}
 
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def me(current_user: User = Depends(get_current_user)):
+async def me(current_user: UserSnapshot = Depends(get_current_user)):
     return UserResponse(
         id=current_user.id,
         email=current_user.email,
@@ -630,7 +733,7 @@ async def me(current_user: User = Depends(get_current_user)):
 @app.post("/api/profile", response_model=ProfileResponse)
 async def create_profile(
     data: ProfileCreate,
-    user: User = Depends(get_current_user),
+    user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
@@ -641,11 +744,14 @@ async def create_profile(
         profile = UserProfile(user_id=user.id, **data.dict())
         db.add(profile)
 
-    user.is_onboarded = True
-    user.current_stage = "dashboard"
+    db_user = load_user(db, user)
+    db_user.is_onboarded = True
+    db_user.current_stage = "dashboard"
 
     db.commit()
     db.refresh(profile)
+    invalidate_user(user.id)
+    ai_counsellor.invalidate_context(user.id)
     return ProfileResponse(**profile.__dict__)
 
 # --------------------------------------------------
@@ -654,54 +760,249 @@ async def create_profile(
 @app.post("/api/counsellor/chat")
 async def chat(
     payload: dict,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserSnapshot = Depends(get_current_user),
+    db=Depends(get_session),
 ):
     if not user.is_onboarded:
         raise HTTPException(400, "Complete onboarding first")
 
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
     return {
         "response": await ai_counsellor.chat(
             payload.get("message", ""),
-            profile,
             user.current_stage,
             db,
             user.id,
         )
     }
 
+@app.get("/api/counsellor/analysis")
+async def analysis(
+    user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    if not user.is_onboarded:
+        raise HTTPException(400, "Complete onboarding first")
+
+    return {"analysis": await ai_counsellor.analyze_profile(db, user.id)}
+
+@app.get("/api/counsellor/recommendations")
+async def recommendations(
+    user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    if not user.is_onboarded:
+        raise HTTPException(400, "Complete onboarding first")
+
+    return {"recommendations": await ai_counsellor.recommend_universities(db, user.id)}
+
+@app.post("/api/counsellor/chat/stream")
+async def chat_stream(
+    payload: dict,
+    user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Streams the answer as NDJSON: {"delta": "..."} lines, then {"done": true}."""
+    if not user.is_onboarded:
+        raise HTTPException(400, "Complete onboarding first")
+
+    chunks = ai_counsellor.chat_stream(
+        payload.get("message", ""),
+        user.current_stage,
+        db,
+        user.id,
+    )
+
+    async def ndjson():
+        async for chunk in chunks:
+            yield json.dumps({"delta": chunk}) + "\n"
+        yield json.dumps({"done": True}) + "\n"
+
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        # Stop proxies (nginx/Railway) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # --------------------------------------------------
 # UNIVERSITIES (SHORTENED – LOGIC UNCHANGED)
 # --------------------------------------------------
 @app.get("/api/universities", response_model=list[UniversityResponse])
 async def universities(
-    current_user: User = Depends(get_current_user),
+    country: str = None,
+    budget_min: float = None,
+    budget_max: float = None,
+    show_all: bool = False,
+    program: str = None,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db=Depends(get_session),
+):
+    def recommended(session: Session):
+        return university_service.get_recommended_universities(
+            session, _profile(session, current_user.id),
+            country=country, budget_min=budget_min, budget_max=budget_max, show_all=show_all,
+            program=program,
+        )
+
+    return await run_db(db, recommended)
+
+@app.get("/api/universities/ranked", response_model=UniversityPage)
+async def ranked_universities(
+    country: str = None,
+    budget_min: float = None,
+    budget_max: float = None,
+    show_all: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str = None,
+    program: str = None,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db=Depends(get_session),
+):
+    def ranked(session: Session):
+        return university_service.rank_page(
+            session, _profile(session, current_user.id),
+            country=country, budget_min=budget_min, budget_max=budget_max, show_all=show_all,
+            limit=limit, cursor=cursor, program=program,
+        )
+
+    try:
+        page, next_cursor, total = await run_db(db, ranked)
+    except InvalidCursor as e:
+        raise HTTPException(400, str(e))
+    return UniversityPage(data=page, next_cursor=next_cursor, total=total)
+
+@app.get("/api/universities/search", response_model=list[UniversityResponse])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db=Depends(get_session),
+):
+    """Prefix and typo-tolerant search over name, city, country and programs"""
+    results = await run_db(db, search_universities, q, limit)
+    return [uni for _, uni in results]
+
+@app.post("/api/universities/shortlist", status_code=201)
+async def shortlist_university(
+    data: UniversityShortlist,
+    user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    existing = db.query(ShortlistedUniversity).filter(
+        ShortlistedUniversity.user_id == user.id,
+        ShortlistedUniversity.university_id == data.university_id,
+    ).first()
+    if existing:
+        raise HTTPException(400, "University already shortlisted")
+
+    db.add(ShortlistedUniversity(
+        user_id=user.id,
+        university_id=data.university_id,
+        category=data.category,
+        notes=data.notes,
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request shortlisted it first (unique user_id, university_id)
+        db.rollback()
+        raise HTTPException(400, "University already shortlisted")
+    ai_counsellor.invalidate_context(user.id)
+    return {"message": "University shortlisted successfully"}
+
+@app.get("/api/universities/shortlisted", response_model=UniversityListResponse)
+async def shortlisted_universities(
+    user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    rows = (
+        db.query(University)
+        .join(ShortlistedUniversity, ShortlistedUniversity.university_id == University.id)
+        .filter(ShortlistedUniversity.user_id == user.id)
+        .all()
+    )
+    return UniversityListResponse(data=[UniversityResponse.model_validate(u) for u in rows])
+
+@app.post("/api/universities/lock", status_code=201)
+async def lock_university(
+    data: UniversityLock,
+    user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    shortlisted = db.query(ShortlistedUniversity).filter(
+        ShortlistedUniversity.user_id == user.id,
+        ShortlistedUniversity.university_id == data.university_id,
+    ).first()
+    if not shortlisted:
+        raise HTTPException(400, "University must be shortlisted before locking")
+
+    existing = db.query(LockedUniversity).filter(
+        LockedUniversity.user_id == user.id,
+        LockedUniversity.university_id == data.university_id,
+    ).first()
+    if existing:
+        raise HTTPException(400, "University already locked")
+
+    db.add(LockedUniversity(user_id=user.id, university_id=data.university_id))
+    load_user(db, user).current_stage = "application"
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(400, "University already locked")
+    invalidate_user(user.id)
+    ai_counsellor.invalidate_context(user.id)
+    return {"message": "University locked successfully"}
+
+@app.get("/api/universities/locked", response_model=UniversityListResponse)
+async def locked_universities(
+    user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
-    return university_service.get_recommended_universities(db, profile)
+    rows = (
+        db.query(University)
+        .join(LockedUniversity, LockedUniversity.university_id == University.id)
+        .filter(LockedUniversity.user_id == user.id)
+        .all()
+    )
+    return UniversityListResponse(data=[UniversityResponse.model_validate(u) for u in rows])
+
+@app.delete("/api/universities/lock/{university_id}")
+async def unlock_university(
+    university_id: int,
+    user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    locked = db.query(LockedUniversity).filter(
+        LockedUniversity.user_id == user.id,
+        LockedUniversity.university_id == university_id,
+    ).first()
+    if not locked:
+        raise HTTPException(404, "University not found in locked list")
+
+    db.delete(locked)
+    db.commit()
+    ai_counsellor.invalidate_context(user.id)
+    return {"message": "University unlocked successfully"}
 
 # --------------------------------------------------
 # TODOS
 # --------------------------------------------------
 @app.get("/api/todos", response_model=list[TodoResponse])
 async def todos(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserSnapshot = Depends(get_current_user),
+    db=Depends(get_session),
 ):
-    return db.query(TodoTask).filter(TodoTask.user_id == user.id).all()
+    return await run_db(db, lambda session: session.query(TodoTask).filter(TodoTask.user_id == user.id).all())
 
 @app.post("/api/todos", response_model=TodoResponse)
 async def create_todo(
     data: TodoCreate,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserSnapshot = Depends(get_current_user),
+    db=Depends(get_session),
 ):
-    todo = TodoTask(user_id=user.id, **data.dict())
-    db.add(todo)
-    db.commit()
-    db.refresh(todo)
+    todo = await run_db(db, _save, TodoTask(user_id=user.id, **data.dict()))
+    ai_counsellor.invalidate_context(user.id)
     return todo
 
 # --------------------------------------------------
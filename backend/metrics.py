@@ -0,0 +1,228 @@
+"""
+In-process Prometheus metrics and the ASGI middleware that records HTTP requests.
+
+Counters, gauges and histograms here render in the Prometheus text format at
+/metrics. Each process keeps its own numbers, so with several workers every worker
+is scraped separately (or use one worker per container, as start.sh does).
+
+The middleware is a plain ASGI wrapper (no BaseHTTPMiddleware task or request
+object) and does a few dict lookups and two clock reads per request.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Callable, Iterable
+
+import query_stats
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+
+# Seconds; covers cached API responses (~1 ms) up to slow Gemini answers
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+        lines = self._header()
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+# Called before rendering to refresh gauges that are read from elsewhere (pools, caches)
+_collectors: list[Callable[[], None]] = []
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    _collectors.append(fn)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    for collect in _collectors:
+        collect()
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+http_requests = Counter("http_requests_total", "HTTP requests by route, method and status code.", ("route", "method", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("route", "method"))
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+db_queries = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request.", ("route",), buckets=QUERY_COUNT_BUCKETS
+)
+db_time = Histogram("db_seconds_per_request", "Time spent in SQL statements per HTTP request.", ("route",))
+gemini_latency = Histogram("gemini_request_duration_seconds", "Gemini generate_content calls by model and outcome.", ("model", "outcome"))
+gemini_fallbacks = Counter("gemini_fallbacks_total", "Times a Gemini model was skipped for the next one.", ("model", "reason"))
+password_hash_latency = Histogram(
+    "password_hash_duration_seconds", "bcrypt work by operation.", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+db_pool_connections = Gauge("db_pool_connections", "Pooled connections by engine and state.", ("engine", "state"))
+db_pool_checkouts = Gauge("db_pool_checkouts", "Pool checkouts since start.", ("engine",))
+db_pool_timeouts = Gauge("db_pool_checkout_timeouts", "Pool checkouts that timed out since start.", ("engine",))
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection, by engine.", ("engine",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+
+
+# --- HTTP middleware ----------------------------------------------------------------
+
+_route_templates: dict = {}
+
+
+def _route_label(scope) -> str:
+    """The matched route's path template, so /api/universities/lock/7 and /8 share a series."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if not scope.get("path_params"):
+        return scope["path"]  # without parameters the matched path is the template
+    if endpoint not in _route_templates:
+        for route in getattr(scope.get("app"), "routes", ()):
+            _route_templates.setdefault(getattr(route, "endpoint", None), getattr(route, "path", None))
+    return _route_templates.get(endpoint) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Records count, latency, status and SQL statements per route for every HTTP request.
+
+    Statement counts come from query_stats, so QueryStatsMiddleware must wrap this one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            route = _route_label(scope)
+            method = scope["method"]
+            http_requests.inc(route, method, str(status))
+            http_latency.observe(elapsed, route, method)
+            queries = query_stats.current()
+            if queries is not None:
+                db_queries.observe(queries.count, route)
+                db_time.observe(queries.seconds, route)
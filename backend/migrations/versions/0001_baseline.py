@@ -0,0 +1,146 @@
+"""baseline schema
+
+The tables as the app created them with Base.metadata.create_all() before migrations
+existed. Databases that already have them (any deployment so far) only get the USD
+tuition columns if those are missing, so `alembic upgrade head` works everywhere.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_baseline'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("users"):
+        existing = {c["name"] for c in inspector.get_columns("universities")}
+        for column in ("tuition_min_usd", "tuition_max_usd", "living_cost_usd"):
+            if column not in existing:
+                op.add_column("universities", sa.Column(column, sa.Float()))
+                op.create_index(f"ix_universities_{column}", "universities", [column])
+        return
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("full_name", sa.String(), nullable=False),
+        sa.Column("is_onboarded", sa.Boolean()),
+        sa.Column("current_stage", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "user_profiles",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False, unique=True),
+        sa.Column("current_degree", sa.String()),
+        sa.Column("current_gpa", sa.Float()),
+        sa.Column("current_institution", sa.String()),
+        sa.Column("field_of_study", sa.String()),
+        sa.Column("graduation_year", sa.Integer()),
+        sa.Column("desired_degree", sa.String()),
+        sa.Column("desired_field", sa.String()),
+        sa.Column("preferred_countries", sa.String()),
+        sa.Column("study_start_year", sa.Integer()),
+        sa.Column("budget_min", sa.Float()),
+        sa.Column("budget_max", sa.Float()),
+        sa.Column("currency", sa.String()),
+        sa.Column("toefl_score", sa.Integer()),
+        sa.Column("ielts_score", sa.Float()),
+        sa.Column("gre_score", sa.Integer()),
+        sa.Column("gmat_score", sa.Integer()),
+        sa.Column("exam_status", sa.String()),
+        sa.Column("work_experience_years", sa.Integer()),
+        sa.Column("research_experience", sa.Boolean()),
+        sa.Column("publications", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_user_profiles_id", "user_profiles", ["id"])
+
+    op.create_table(
+        "universities",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("country", sa.String(), nullable=False),
+        sa.Column("city", sa.String()),
+        sa.Column("ranking", sa.Integer()),
+        sa.Column("acceptance_rate", sa.Float()),
+        sa.Column("programs_offered", sa.Text()),
+        sa.Column("tuition_min", sa.Float()),
+        sa.Column("tuition_max", sa.Float()),
+        sa.Column("currency", sa.String()),
+        sa.Column("living_cost_estimate", sa.Float()),
+        sa.Column("tuition_min_usd", sa.Float()),
+        sa.Column("tuition_max_usd", sa.Float()),
+        sa.Column("living_cost_usd", sa.Float()),
+        sa.Column("min_gpa", sa.Float()),
+        sa.Column("toefl_required", sa.Boolean()),
+        sa.Column("ielts_required", sa.Boolean()),
+        sa.Column("gre_required", sa.Boolean()),
+        sa.Column("gmat_required", sa.Boolean()),
+        sa.Column("website", sa.String()),
+        sa.Column("description", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    for column in ("id", "name", "country", "tuition_min_usd", "tuition_max_usd", "living_cost_usd"):
+        op.create_index(f"ix_universities_{column}", "universities", [column])
+
+    op.create_table(
+        "shortlisted_universities",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("university_id", sa.Integer(), sa.ForeignKey("universities.id"), nullable=False),
+        sa.Column("category", sa.String()),
+        sa.Column("notes", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_shortlisted_universities_id", "shortlisted_universities", ["id"])
+
+    op.create_table(
+        "locked_universities",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("university_id", sa.Integer(), sa.ForeignKey("universities.id"), nullable=False),
+        sa.Column("locked_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_locked_universities_id", "locked_universities", ["id"])
+
+    op.create_table(
+        "todo_tasks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("university_id", sa.Integer(), sa.ForeignKey("universities.id"), nullable=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("priority", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("due_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_todo_tasks_id", "todo_tasks", ["id"])
+
+
+def downgrade() -> None:
+    for table in ("todo_tasks", "locked_universities", "shortlisted_universities",
+                  "universities", "user_profiles", "users"):
+        op.drop_table(table)
@@ -0,0 +1,56 @@
+"""per-user indexes and (user_id, university_id) uniqueness
+
+Every shortlist, lock, todo and counsellor-context read filters on user_id, which had
+no index. The unique indexes on (user_id, university_id) serve both the per-user
+lookups and the "already shortlisted/locked" checks, and stop concurrent requests
+from inserting the same pair twice; existing duplicates are removed first (oldest
+row kept). Indexes that already exist (created by create_all) are skipped.
+
+Revision ID: 0002_per_user_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_per_user_indexes'
+down_revision: Union[str, None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns, unique)
+INDEXES = (
+    ("uq_shortlisted_universities_user_university", "shortlisted_universities", ["user_id", "university_id"], True),
+    ("ix_shortlisted_universities_university_id", "shortlisted_universities", ["university_id"], False),
+    ("uq_locked_universities_user_university", "locked_universities", ["user_id", "university_id"], True),
+    ("ix_locked_universities_university_id", "locked_universities", ["university_id"], False),
+    ("ix_todo_tasks_user_id_status", "todo_tasks", ["user_id", "status"], False),
+    ("ix_todo_tasks_university_id", "todo_tasks", ["university_id"], False),
+)
+
+
+def _existing_indexes(table: str) -> set:
+    return {ix["name"] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    for table in ("shortlisted_universities", "locked_universities"):
+        op.execute(sa.text(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {table} GROUP BY user_id, university_id)"
+        ))
+
+    for name, table, columns, unique in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
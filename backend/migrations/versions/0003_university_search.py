@@ -0,0 +1,51 @@
+"""trigram and full-text search indexes on universities (Postgres only)
+
+Adds generated search_text / search_vector columns over name, city, country and
+programs_offered with pg_trgm and tsvector GIN indexes for /api/universities/search,
+and a trigram index on country so the ILIKE '%country%' filter can use an index.
+Other databases are left alone; search falls back to the in-memory index there.
+
+Revision ID: 0003_university_search
+Revises: 0002_per_user_indexes
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_university_search'
+down_revision: Union[str, None] = '0002_per_user_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_TEXT = (
+    "lower(coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || "
+    "coalesce(country, '') || ' ' || coalesce(programs_offered, ''))"
+)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(f"ALTER TABLE universities ADD COLUMN IF NOT EXISTS search_text text GENERATED ALWAYS AS ({SEARCH_TEXT}) STORED")
+    op.execute(
+        "ALTER TABLE universities ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('simple', {SEARCH_TEXT})) STORED"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_universities_search_text_trgm ON universities USING gin (search_text gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_universities_search_vector ON universities USING gin (search_vector)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_universities_country_trgm ON universities USING gin (country gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_universities_country_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_universities_search_vector")
+    op.execute("DROP INDEX IF EXISTS ix_universities_search_text_trgm")
+    op.execute("ALTER TABLE universities DROP COLUMN IF EXISTS search_vector")
+    op.execute("ALTER TABLE universities DROP COLUMN IF EXISTS search_text")
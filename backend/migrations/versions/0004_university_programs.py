@@ -0,0 +1,76 @@
+"""university_programs join table, backfilled from programs_offered
+
+programs_offered stays as the JSON string the API returns; this table holds one
+indexed row per program so "universities offering X" is a single lookup.
+
+Revision ID: 0004_university_programs
+Revises: 0003_university_search
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_university_programs'
+down_revision: Union[str, None] = '0003_university_search'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _program_names(programs_offered):
+    # Frozen copy of programs.parse_programs, so this migration doesn't change with the app
+    if not programs_offered:
+        return []
+    try:
+        values = json.loads(programs_offered)
+    except ValueError:
+        values = programs_offered.split(",")
+    if isinstance(values, str):
+        values = [values]
+    names = {}
+    for value in values if isinstance(values, list) else []:
+        name = " ".join(str(value).split())
+        if name and name.lower() not in names:
+            names[name.lower()] = name
+    return list(names.items())
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("university_programs"):
+        op.create_table(
+            "university_programs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("university_id", sa.Integer(), sa.ForeignKey("universities.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("name_key", sa.String(), nullable=False),
+        )
+        op.create_index("ix_university_programs_id", "university_programs", ["id"])
+        op.create_index("uq_university_programs_name_key_university", "university_programs",
+                        ["name_key", "university_id"], unique=True)
+        op.create_index("ix_university_programs_university_id", "university_programs", ["university_id"])
+
+    programs = sa.table(
+        "university_programs",
+        sa.column("university_id", sa.Integer),
+        sa.column("name", sa.String),
+        sa.column("name_key", sa.String),
+    )
+    done = {row[0] for row in bind.execute(sa.text("SELECT DISTINCT university_id FROM university_programs"))}
+    rows = [
+        {"university_id": uni_id, "name": name, "name_key": key}
+        for uni_id, programs_offered in bind.execute(sa.text("SELECT id, programs_offered FROM universities"))
+        if uni_id not in done
+        for key, name in _program_names(programs_offered)
+    ]
+    if rows:
+        op.bulk_insert(programs, rows)
+
+
+def downgrade() -> None:
+    op.drop_table("university_programs")
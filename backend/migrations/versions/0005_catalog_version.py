@@ -0,0 +1,34 @@
+"""catalog_version row shared by every server process
+
+The seed and FX refresh scripts run as their own processes; bumping this row is how
+running servers learn the catalog (e.g. USD tuition) changed and reload it.
+
+Revision ID: 0005_catalog_version
+Revises: 0004_university_programs
+Create Date: 2026-10-18 20:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_catalog_version'
+down_revision: Union[str, None] = '0004_university_programs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table("catalog_version"):
+        op.create_table(
+            "catalog_version",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("catalog_version")
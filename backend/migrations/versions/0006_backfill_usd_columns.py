@@ -0,0 +1,47 @@
+"""fill in USD tuition columns left NULL by 0001_baseline
+
+0001_baseline adds tuition_min_usd / tuition_max_usd / living_cost_usd to existing
+universities tables without values, and the app's startup refresh never ran for them
+once start.sh migrated first. Rows with an amount but no USD value get it from the rates
+in fx_rates.py (`python fx_rates.py` recomputes every row after a rate change), and the
+catalog version is bumped so running servers reload.
+
+Revision ID: 0006_backfill_usd_columns
+Revises: 0005_catalog_version
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from fx_rates import USD_COLUMNS, to_usd
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_backfill_usd_columns'
+down_revision: Union[str, None] = '0005_catalog_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    sources = ", ".join(source for _, source in USD_COLUMNS)
+    missing = " OR ".join(f"({source} IS NOT NULL AND {column} IS NULL)" for column, source in USD_COLUMNS)
+    rows = conn.execute(sa.text(f"SELECT id, currency, {sources} FROM universities WHERE {missing}")).all()
+    updates = [
+        {"id": row.id, **{column: to_usd(getattr(row, source), row.currency) for column, source in USD_COLUMNS}}
+        for row in rows
+    ]
+    if not updates:
+        return
+    assignments = ", ".join(f"{column} = :{column}" for column, _ in USD_COLUMNS)
+    conn.execute(sa.text(f"UPDATE universities SET {assignments} WHERE id = :id"), updates)
+    if not conn.execute(sa.text("UPDATE catalog_version SET version = version + 1 WHERE id = 1")).rowcount:
+        conn.execute(sa.text("INSERT INTO catalog_version (id, version) VALUES (1, 1)"))
+
+
+def downgrade() -> None:
+    pass  # the values are derived data; nothing to undo
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, Text, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, Boolean, Text, DateTime, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -82,6 +82,10 @@ class University(Base):
     tuition_max = Column(Float)
     currency = Column(String, default="USD")
     living_cost_estimate = Column(Float)
+    # The same amounts in USD (see fx_rates.py), so budgets compare across currencies
+    tuition_min_usd = Column(Float, index=True)
+    tuition_max_usd = Column(Float, index=True)
+    living_cost_usd = Column(Float, index=True)
     
     # Requirements
     min_gpa = Column(Float)
@@ -95,6 +99,32 @@ class University(Base):
     description = Column(Text)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    programs = relationship("UniversityProgram", back_populates="university", cascade="all, delete-orphan")
+
+class UniversityProgram(Base):
+    """One row per entry of University.programs_offered, so program filters are indexed lookups"""
+    __tablename__ = "university_programs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    university_id = Column(Integer, ForeignKey("universities.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String, nullable=False)  # as written, e.g. "Computer Science"
+    name_key = Column(String, nullable=False)  # lowercased for matching, e.g. "computer science"
+    
+    university = relationship("University", back_populates="programs")
+    
+    __table_args__ = (
+        # "universities offering X" is a lookup on name_key; the pair is unique per university
+        Index("uq_university_programs_name_key_university", "name_key", "university_id", unique=True),
+        Index("ix_university_programs_university_id", "university_id"),
+    )
+
+class CatalogVersion(Base):
+    """Single row (id 1) bumped whenever the universities catalog is written, so every server process reloads it"""
+    __tablename__ = "catalog_version"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
 
 class ShortlistedUniversity(Base):
     __tablename__ = "shortlisted_universities"
@@ -108,6 +138,12 @@ class ShortlistedUniversity(Base):
     
     user = relationship("User", backref="shortlisted_universities")
     university = relationship("University")
+    
+    # Per-user reads and the "already shortlisted" check; also rejects duplicate rows
+    __table_args__ = (
+        Index("uq_shortlisted_universities_user_university", "user_id", "university_id", unique=True),
+        Index("ix_shortlisted_universities_university_id", "university_id"),
+    )
 
 class LockedUniversity(Base):
     __tablename__ = "locked_universities"
@@ -119,6 +155,11 @@ class LockedUniversity(Base):
     
     user = relationship("User", backref="locked_universities")
     university = relationship("University")
+    
+    __table_args__ = (
+        Index("uq_locked_universities_user_university", "user_id", "university_id", unique=True),
+        Index("ix_locked_universities_university_id", "university_id"),
+    )
 
 class TodoTask(Base):
     __tablename__ = "todo_tasks"
@@ -139,4 +180,10 @@ class TodoTask(Base):
     
     user = relationship("User", backref="todos")
     university = relationship("University")
+    
+    # Todo listings and the counsellor's open-todo query filter on user_id (and status)
+    __table_args__ = (
+        Index("ix_todo_tasks_user_id_status", "user_id", "status"),
+        Index("ix_todo_tasks_university_id", "university_id"),
+    )
 
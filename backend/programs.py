@@ -0,0 +1,56 @@
+"""
+Helpers for the university_programs table (the normalized form of
+University.programs_offered, which stays as the JSON string the API returns).
+"""
+import json
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import University, UniversityProgram
+
+
+def program_key(name: Optional[str]) -> str:
+    """Matching key for a program or desired field: lowercased, whitespace collapsed."""
+    return " ".join((name or "").lower().split())
+
+
+def parse_programs(programs_offered: Optional[str]) -> list[str]:
+    """Program names from the JSON array string, de-duplicated by key, in original order."""
+    if not programs_offered:
+        return []
+    try:
+        values = json.loads(programs_offered)
+    except ValueError:
+        values = programs_offered.split(",")
+    if isinstance(values, str):
+        values = [values]
+    names = {}
+    for value in values if isinstance(values, list) else []:
+        name = " ".join(str(value).split())
+        if name and program_key(name) not in names:
+            names[program_key(name)] = name
+    return list(names.values())
+
+
+def program_rows(programs_offered: Optional[str]) -> list[UniversityProgram]:
+    """UniversityProgram objects for a new University (University(..., programs=program_rows(...)))."""
+    return [UniversityProgram(name=name, name_key=program_key(name)) for name in parse_programs(programs_offered)]
+
+
+def backfill_programs(db: Session) -> int:
+    """Fill university_programs for universities that have none yet; returns rows added."""
+    have_programs = db.query(UniversityProgram.university_id).distinct()
+    added = 0
+    for uni in db.query(University).filter(~University.id.in_(have_programs)):
+        rows = program_rows(uni.programs_offered)
+        uni.programs.extend(rows)
+        added += len(rows)
+    db.commit()
+    return added
+
+
+def programs_missing(db: Session) -> bool:
+    """True when there are universities but university_programs is empty (table just created)."""
+    return db.query(func.count(UniversityProgram.id)).scalar() == 0 and db.query(University.id).first() is not None
@@ -0,0 +1,138 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+
+from rate_limiter import estimate_tokens
+
+# Upper bound for a prompt before optional context starts being trimmed
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+
+
+def _cell(value: Any) -> str:
+    if value is None or value == "":
+        return "-"
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def compact_table(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> str:
+    """Pipe-separated table: one header line, one line per row. Far cheaper than pretty JSON."""
+    lines = ["|".join(columns)]
+    lines.extend("|".join(_cell(v) for v in row) for row in rows)
+    return "\n".join(lines)
+
+
+@dataclass
+class _Section:
+    text: str
+    priority: int
+    required: bool
+    title: Optional[str] = None
+    columns: Optional[Sequence[str]] = None
+    rows: list = field(default_factory=list)
+    min_rows: int = 0
+    omitted: int = 0
+
+    def render(self) -> str:
+        if self.columns is None:
+            return self.text
+        body = compact_table(self.columns, self.rows) if self.rows else "None"
+        if self.omitted:
+            body += f"\n(+{self.omitted} more not shown)"
+        return f"{self.title}:\n{body}" if self.title else body
+
+    def trimmable(self) -> bool:
+        if self.required:
+            return False
+        # A table cut down to its min_rows floor is as required as it gets
+        return not (self.columns is not None and self.min_rows > 0 and len(self.rows) <= self.min_rows)
+
+
+class PromptBuilder:
+    """Assembles a prompt from sections and fits it into a token budget.
+
+    Sections render in the order they are added. When the prompt is over budget, the
+    lowest-priority (highest number) optional section is trimmed first: tables lose rows
+    from the end (so add rows most-important first), other sections are dropped.
+    Required sections are never touched, and a table with min_rows never goes below
+    them; it is then left alone and trimming moves on to the next section.
+    """
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self._sections: list[_Section] = []
+
+    def add(self, text: str, priority: int = 0, required: bool = False) -> "PromptBuilder":
+        self._sections.append(_Section(text=text, priority=priority, required=required))
+        return self
+
+    def add_table(
+        self,
+        title: str,
+        columns: Sequence[str],
+        rows: Sequence[Sequence[Any]],
+        priority: int = 0,
+        min_rows: int = 0,
+    ) -> "PromptBuilder":
+        self._sections.append(_Section(
+            text="", priority=priority, required=False,
+            title=title, columns=columns, rows=list(rows), min_rows=min_rows,
+        ))
+        return self
+
+    def _render(self) -> str:
+        return "\n\n".join(s.render() for s in self._sections)
+
+    def build(self) -> tuple[str, int]:
+        """Return (prompt, estimated token count)."""
+        prompt = self._render()
+        tokens = estimate_tokens(prompt)
+        while tokens > self.budget:
+            trimmable = [s for s in self._sections if s.trimmable()]
+            if not trimmable:
+                break
+            victim = max(trimmable, key=lambda s: s.priority)
+            if victim.columns is not None and len(victim.rows) > victim.min_rows:
+                # Cut roughly enough rows to cover the overflow, at least one
+                per_row = max(1, estimate_tokens(victim.render()) // max(1, len(victim.rows) + 1))
+                cut = max(1, min(len(victim.rows) - victim.min_rows, (tokens - self.budget) // per_row + 1))
+                del victim.rows[-cut:]
+                victim.omitted += cut
+            else:
+                self._sections.remove(victim)
+            prompt = self._render()
+            tokens = estimate_tokens(prompt)
+        return prompt, tokens
+
+
+class PromptStats:
+    """Running prompt-size figures for diagnostics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last_tokens = 0
+        self.over_budget = 0
+
+    def record(self, tokens: int, budget: int) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_tokens += tokens
+            self.max_tokens = max(self.max_tokens, tokens)
+            self.last_tokens = tokens
+            if tokens > budget:
+                self.over_budget += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "prompts": self.count,
+                "avg_tokens": round(self.total_tokens / self.count, 1) if self.count else 0.0,
+                "max_tokens": self.max_tokens,
+                "last_tokens": self.last_tokens,
+                "over_budget": self.over_budget,
+            }
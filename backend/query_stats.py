@@ -0,0 +1,152 @@
+"""
+Per-request SQL statement counts and database time, from SQLAlchemy engine events.
+
+Every HTTP request gets a RequestQueries (via QueryStatsMiddleware) that the engine
+listeners fill in: statement count, time spent in the driver, and how often each
+statement shape ran. A shape that runs more than N_PLUS_ONE_THRESHOLD times in one
+request is logged as a likely N+1. With DEBUG=true the totals are also sent back as
+X-DB-Queries / X-DB-Time-Ms response headers (for streamed responses, the totals
+when the headers went out).
+
+Outside HTTP (scripts, a REPL, the tests' query_budget fixture) assert_query_budget checks
+a block; statements counted by a nested block (such as a request's) count toward it too:
+
+    with assert_query_budget(3):
+        service.rank_page(db, profile, ...)
+"""
+import contextlib
+import contextvars
+import logging
+import os
+import re
+import time
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+
+log = logging.getLogger("uvicorn.error")
+
+DEBUG = os.getenv("DEBUG", "false").strip().lower() in ("1", "true", "yes")
+# A statement run more than this many times in one request is reported; 0 disables
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """`statement` with literals replaced by ? and whitespace collapsed, for logs."""
+    return _SPACE.sub(" ", _LITERALS.sub("?", statement)).strip()
+
+
+class RequestQueries:
+    """Statements run in one request (or one assert_query_budget block)."""
+
+    __slots__ = ("label", "count", "seconds", "shapes", "parent")
+
+    def __init__(self, label: str = "", parent: Optional["RequestQueries"] = None):
+        self.label = label
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        # statement text -> times run; ORM statements keep their parameters out of the text
+        self.shapes: dict[str, int] = {}
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement] = self.shapes.get(statement, 0) + 1
+        if self.parent is not None:
+            self.parent.record(statement, seconds)
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[tuple[str, int]]:
+        """(shape, times run) for statements run more than `threshold` times, most frequent first."""
+        if threshold <= 0:
+            return []
+        merged: dict[str, int] = {}
+        for statement, times in self.shapes.items():
+            shape = statement_shape(statement)
+            merged[shape] = merged.get(shape, 0) + times
+        return sorted(((s, n) for s, n in merged.items() if n > threshold), key=lambda item: -item[1])
+
+    def warn_repeated(self) -> None:
+        for shape, times in self.repeated():
+            log.warning("possible N+1 in %s: %d x %s", self.label or "request", times, shape[:300])
+
+
+_current: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar("request_queries", default=None)
+
+
+def current() -> Optional[RequestQueries]:
+    """The RequestQueries being filled in for this request, if any."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def track_queries(label: str = "") -> Iterator[RequestQueries]:
+    """Collect the statements run inside the block; they also count toward an enclosing block."""
+    queries = RequestQueries(label, parent=_current.get())
+    token = _current.set(queries)
+    try:
+        yield queries
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def assert_query_budget(max_queries: int, label: str = "") -> Iterator[RequestQueries]:
+    """Raise AssertionError if the block runs more than `max_queries` statements."""
+    with track_queries(label) as queries:
+        yield queries
+    if queries.count > max_queries:
+        detail = "; ".join(f"{n} x {s[:120]}" for s, n in queries.repeated(1)[:3])
+        raise AssertionError(
+            f"{label or 'block'} ran {queries.count} SQL statements, budget {max_queries}"
+            + (f" (repeated: {detail})" if detail else "")
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    if queries is not None:
+        starts = conn.info.get("query_start")
+        elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+        queries.record(statement, elapsed)
+
+
+def instrument_engine(engine) -> None:
+    """Attach the listeners to a sync engine (pass async engines' sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """Tracks each HTTP request's statements; logs N+1 shapes and, with DEBUG, adds response headers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_queries(f'{scope["method"]} {scope["path"]}') as queries:
+            if DEBUG:
+                async def send_with_headers(message):
+                    if message["type"] == "http.response.start":
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"x-db-queries", str(queries.count).encode()),
+                            (b"x-db-time-ms", f"{queries.seconds * 1000:.2f}".encode()),
+                        ]
+                    await send(message)
+
+                await self.app(scope, receive, send_with_headers)
+            else:
+                await self.app(scope, receive, send)
+        if N_PLUS_ONE_THRESHOLD > 0 and queries.count > N_PLUS_ONE_THRESHOLD:
+            queries.warn_repeated()
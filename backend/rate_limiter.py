@@ -0,0 +1,169 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+# Client-side Gemini budget, per model. Defaults match the free tier for the flash
+# models; raise them on a paid key. 0 disables that limit.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_QUEUE_SIZE = int(os.getenv("GEMINI_QUEUE_SIZE", "100"))
+GEMINI_QUEUE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", "30"))
+# Expected answer length, counted against TPM together with the prompt
+GEMINI_EST_OUTPUT_TOKENS = int(os.getenv("GEMINI_EST_OUTPUT_TOKENS", "800"))
+
+# Lower value = served first
+PRIORITY_CHAT = 0
+PRIORITY_BACKGROUND = 1
+
+
+class QueueFull(Exception):
+    """The model's wait queue is at capacity."""
+
+
+class QueueTimeout(Exception):
+    """Waited longer than the queue timeout for budget."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English prose)."""
+    return len(text or "") // 4 + 1
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled continuously over one minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class _ModelQueue:
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.waiters: list = []  # heap of [priority, seq, wake-up event]
+
+
+class GeminiRateLimiter:
+    """Per-model requests/min and tokens/min budget with a bounded priority wait queue.
+
+    acquire() waits on the event loop, before any Gemini pool thread is used, so the
+    full GEMINI_QUEUE_SIZE can queue and pool threads only ever make calls. Waiters
+    are served strictly by priority, then arrival order, so chat overtakes background
+    analysis when both are queued. Only use it from the event loop.
+    """
+
+    def __init__(
+        self,
+        rpm: float = GEMINI_RPM,
+        tpm: float = GEMINI_TPM,
+        max_queue: int = GEMINI_QUEUE_SIZE,
+        timeout: float = GEMINI_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._queues: dict[str, _ModelQueue] = {}
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self.rpm, self.tpm)
+        return queue
+
+    def _wait_time(self, queue: _ModelQueue, tokens: int, now: float) -> float:
+        return max(queue.requests.wait_time(1, now), queue.tokens.wait_time(tokens, now))
+
+    def _has_budget(self, queue: _ModelQueue, tokens: int, now: float) -> bool:
+        return self._wait_time(queue, tokens, now) <= 0
+
+    async def acquire(self, model: str, tokens: int, priority: int = PRIORITY_CHAT) -> float:
+        """Wait for budget on `model`; returns seconds waited. Raises QueueFull / QueueTimeout."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        queue = self._queue(model)
+        if not queue.waiters and self._has_budget(queue, tokens, start):
+            queue.requests.take(1)
+            queue.tokens.take(tokens)
+            self.admitted += 1
+            return 0.0
+        if len(queue.waiters) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(model)
+        entry = [priority, next(self._seq), asyncio.Event()]
+        heapq.heappush(queue.waiters, entry)
+        try:
+            while True:
+                now = time.monotonic()
+                if queue.waiters[0] is entry:
+                    wait = self._wait_time(queue, tokens, now)
+                    if wait <= 0:
+                        queue.requests.take(1)
+                        queue.tokens.take(tokens)
+                        break
+                else:
+                    wait = None  # not at the head; woken when the head leaves
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.timed_out += 1
+                    raise QueueTimeout(model)
+                entry[2].clear()
+                try:
+                    await asyncio.wait_for(entry[2].wait(), remaining if wait is None else min(wait, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            queue.waiters.remove(entry)
+            heapq.heapify(queue.waiters)
+            if queue.waiters:
+                queue.waiters[0][2].set()
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.delayed += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def stats(self) -> dict:
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "queue_depth": {model: len(q.waiters) for model, q in self._queues.items()},
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+        }
@@ -89,6 +89,9 @@ class UniversityResponse(BaseModel):
     tuition_max: Optional[float]
     currency: Optional[str]
     living_cost_estimate: Optional[float]
+    tuition_min_usd: Optional[float] = None
+    tuition_max_usd: Optional[float] = None
+    living_cost_usd: Optional[float] = None
     min_gpa: Optional[float]
     toefl_required: Optional[bool]
     ielts_required: Optional[bool]
@@ -114,6 +117,13 @@ class UniversityListResponse(BaseModel):
     data: List[UniversityResponse]
 
 
+class UniversityPage(BaseModel):
+    """One page of the ranked university list; pass next_cursor back to get the next page."""
+    data: List[UniversityResponse]
+    next_cursor: Optional[str] = None
+    total: int
+
+
 # Todo schemas
 def _parse_due_date(v):
     """Accept YYYY-MM-DD or full ISO datetime string for due_date."""
@@ -5,9 +5,13 @@ Run this after setting up the database
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 from models import Base, University
+from catalog_index import bump_catalog_version
+from fx_rates import ensure_usd_columns, usd_values
+from programs import backfill_programs, program_rows
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+ensure_usd_columns(engine)
 
 # Sample university data
 universities_data = [
@@ -721,7 +725,8 @@ def seed_universities():
         if existing_count == 0:
             # Fresh seed: add all
             for uni_data in universities_data:
-                db.add(University(**uni_data))
+                db.add(University(**uni_data, **usd_values(uni_data), programs=program_rows(uni_data.get("programs_offered"))))
+            bump_catalog_version(db)
             db.commit()
             print(f"Successfully seeded {len(universities_data)} universities!")
         else:
@@ -730,10 +735,14 @@ def seed_universities():
             for uni_data in universities_data:
                 if db.query(University).filter(University.name == uni_data["name"]).first():
                     continue
-                db.add(University(**uni_data))
+                db.add(University(**uni_data, **usd_values(uni_data), programs=program_rows(uni_data.get("programs_offered"))))
                 added += 1
             db.commit()
-            if added:
+            # Universities seeded before university_programs existed
+            added_programs = backfill_programs(db)
+            if added or added_programs:
+                bump_catalog_version(db)
+                db.commit()
                 print(f"Added {added} new universities (e.g. India). Total in DB: {existing_count + added}")
             else:
                 print(f"All {len(universities_data)} universities already in DB ({existing_count} records).")
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from models import UserProfile
+
+# Off unless explicitly enabled: a near-duplicate hit answers one student with text
+# generated for another student in the same profile bucket.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2048"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+
+_NUM_PERM = 64
+_BANDS = 16  # LSH bands; _NUM_PERM / _BANDS rows per band
+_ROWS = _NUM_PERM // _BANDS
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SHINGLE = 4
+
+# Fixed (a, b) pairs so signatures are stable across restarts and workers
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_PRIME - 1) + 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _PRIME,
+    )
+    for i in range(_NUM_PERM)
+]
+
+_BUDGET_BANDS = [10_000, 25_000, 50_000, 100_000]
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", " ", (message or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _shingles(text: str) -> set[str]:
+    if len(text) <= _SHINGLE:
+        return {text}
+    return {text[i:i + _SHINGLE] for i in range(len(text) - _SHINGLE + 1)}
+
+
+def minhash(text: str) -> tuple[int, ...]:
+    """MinHash signature over character shingles of already-normalized text."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in _shingles(text)
+    ]
+    return tuple(
+        min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(sig_a: tuple[int, ...], sig_b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / _NUM_PERM
+
+
+def profile_bucket(profile: Optional[UserProfile]) -> tuple:
+    """Coarse profile features; answers are only shared inside one bucket."""
+    if profile is None:
+        return ("no-profile",)
+    gpa_band = int(profile.current_gpa * 2) / 2 if profile.current_gpa else None
+    budget = profile.budget_max or 0
+    budget_band = next((i for i, edge in enumerate(_BUDGET_BANDS) if budget < edge), len(_BUDGET_BANDS))
+    field = (profile.desired_field or "").strip().lower()
+    countries = profile.preferred_countries or ""
+    try:
+        parsed = json.loads(countries)
+        country_list = parsed if isinstance(parsed, list) else [str(parsed)]
+    except (ValueError, TypeError):
+        country_list = countries.split(",")
+    country_key = ",".join(sorted(c.strip().lower() for c in country_list if str(c).strip()))
+    return (gpa_band, budget_band, (profile.currency or "USD").upper(), field, country_key)
+
+
+def context_bucket(profile: Optional[UserProfile], shortlisted=(), locked=(), open_todos=()) -> tuple:
+    """profile_bucket plus a digest of the student's own shortlist, locked universities and open tasks.
+
+    Chat prompts include those lists, so an answer can name the student's schools and tasks;
+    it is only reused for a student with exactly the same ones. Callers add the current stage.
+    """
+    lists = json.dumps([list(shortlisted), list(locked), list(open_todos)], default=str)
+    digest = hashlib.blake2b(lists.encode("utf-8"), digest_size=8).hexdigest()
+    return profile_bucket(profile) + (digest,)
+
+
+class SemanticCache:
+    """Near-duplicate answer cache: MinHash over the normalized message, LSH-banded per profile bucket."""
+
+    def __init__(
+        self,
+        enabled: bool = SEMANTIC_CACHE_ENABLED,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        maxsize: int = SEMANTIC_CACHE_SIZE,
+        ttl: float = SEMANTIC_CACHE_TTL_SECONDS,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple[tuple, tuple[int, ...], str, float]]" = OrderedDict()
+        self._bands: dict[tuple, set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _band_keys(self, bucket: tuple, signature: tuple[int, ...]) -> list[tuple]:
+        return [(bucket, band, signature[band * _ROWS:(band + 1) * _ROWS]) for band in range(_BANDS)]
+
+    def _remove(self, entry_id: int) -> None:
+        bucket, signature, _, _ = self._entries.pop(entry_id)
+        for key in self._band_keys(bucket, signature):
+            ids = self._bands.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._bands[key]
+
+    def lookup(self, message: str, bucket: tuple) -> Optional[str]:
+        """Cached answer for a near-identical message in the same bucket, or None."""
+        if not self.enabled:
+            return None
+        signature = minhash(normalize_message(message))
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(bucket, signature):
+                candidates |= self._bands.get(key, set())
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                _, entry_sig, _, expires_at = self._entries[entry_id]
+                if expires_at < now:
+                    continue
+                score = similarity(signature, entry_sig)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def store(self, message: str, bucket: tuple, answer: str) -> None:
+        if not self.enabled:
+            return
+        signature = minhash(normalize_message(message))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (bucket, signature, answer, time.monotonic() + self.ttl)
+            for key in self._band_keys(bucket, signature):
+                self._bands.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+            self.stores += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -1,3 +1,9 @@
 #!/bin/sh
+set -e
+# Bring the schema up to date first (0001_baseline adopts databases made by create_all);
+# set RUN_MIGRATIONS=false when a release step runs `alembic upgrade head` instead
+if [ "${RUN_MIGRATIONS:-true}" = "true" ]; then
+  alembic upgrade head
+fi
 # Use PORT from env (Railway sets it); default 8000
 exec uvicorn main:app --host 0.0.0.0 --port "${PORT:-8000}"
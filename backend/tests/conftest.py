@@ -0,0 +1,112 @@
+"""
+Shared fixtures. The app reads its settings at import time, so the environment is
+pointed at a throwaway SQLite database before any backend module is imported.
+"""
+import asyncio
+import os
+import tempfile
+import uuid
+
+_DB_DIR = tempfile.mkdtemp(prefix="ai_counsellor_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/test.db"
+os.environ["DATABASE_REPLICA_URL"] = ""
+os.environ["DB_MODE"] = "sync"
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx
+import pytest
+
+from database import Base, SessionLocal, engine
+import models
+from catalog_index import bump_catalog_version
+from fx_rates import ensure_usd_columns, usd_values
+from programs import program_rows
+from query_stats import assert_query_budget
+
+# Rows the seed data never has: NULL and zero scoring columns, which every engine treats as absent
+EDGE_UNIVERSITIES = [
+    {"name": "No Data University", "country": "Nowhere", "currency": "USD"},
+    {"name": "Zero Values Institute", "country": "Nowhere", "ranking": 0, "acceptance_rate": 0.0,
+     "tuition_min": 0, "tuition_max": 0, "min_gpa": 0.0, "currency": "USD"},
+    {"name": "Unranked College", "country": "Nowhere", "acceptance_rate": 0.9, "tuition_min": 5000,
+     "tuition_max": 9000, "currency": "EUR", "min_gpa": 2.0},
+    {"name": "Far Down The List", "country": "Nowhere", "ranking": 1500, "acceptance_rate": 0.5,
+     "tuition_min": 1000, "tuition_max": 2000, "currency": "GBP"},
+]
+
+
+@pytest.fixture(scope="session")
+def catalog_db():
+    """The test database with every table created and the seed catalog loaded."""
+    from seed_universities import universities_data
+
+    Base.metadata.create_all(bind=engine)
+    ensure_usd_columns(engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.University).count() == 0:
+            for uni_data in universities_data + EDGE_UNIVERSITIES:
+                db.add(models.University(
+                    **uni_data, **usd_values(uni_data), programs=program_rows(uni_data.get("programs_offered"))
+                ))
+            bump_catalog_version(db)
+            db.commit()
+    finally:
+        db.close()
+    return engine
+
+
+@pytest.fixture
+def db(catalog_db):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def app(catalog_db):
+    """The FastAPI app; importing main also attaches the SQL statement counters to the engines."""
+    import main
+
+    return main.app
+
+
+@pytest.fixture
+def api(app):
+    """Call the app in-process: api("GET", "/api/todos", headers=...) -> httpx.Response.
+
+    The request runs in a copy of the test's context, so an enclosing query_budget block
+    counts its SQL statements.
+    """
+    def call(method: str, url: str, **kwargs) -> httpx.Response:
+        async def send() -> httpx.Response:
+            async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+                return await client.request(method, url, **kwargs)
+
+        return asyncio.run(send())
+
+    return call
+
+
+@pytest.fixture
+def query_budget(app):
+    """`with query_budget(n):` fails the test if the block runs more than n SQL statements."""
+    return assert_query_budget
+
+
+@pytest.fixture
+def user_headers(db):
+    """Authorization headers for a fresh user with one todo; the user cache starts cold."""
+    from auth import create_access_token, invalidate_user, token_claims
+
+    user = models.User(email=f"user-{uuid.uuid4().hex[:12]}@example.com", hashed_password="-", full_name="Test User")
+    db.add(user)
+    db.flush()
+    db.add(models.TodoTask(user_id=user.id, title="Write statement of purpose"))
+    db.commit()
+    invalidate_user(user.id)
+    return {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
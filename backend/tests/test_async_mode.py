@@ -0,0 +1,57 @@
+"""DB_MODE=async end to end. Settings are read at import time, so each check runs the app in a subprocess."""
+import shutil
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from sqlalchemy.engine import make_url
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+CONCURRENT_COLD_CATALOG = textwrap.dedent("""
+    import asyncio
+
+    import httpx
+
+    import main
+    from auth import create_access_token, token_claims
+    from database import SessionLocal
+    from models import User
+
+    with SessionLocal() as db:
+        user = User(email="async-mode@example.com", hashed_password="-", full_name="Async Mode")
+        db.add(user)
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
+
+    async def run():
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            responses = await asyncio.wait_for(asyncio.gather(*(
+                client.get("/api/universities", params={"show_all": True}, headers=headers) for _ in range(8)
+            )), timeout=20)
+        print(sorted({(r.status_code, len(r.json())) for r in responses}))
+
+    asyncio.run(run())
+""")
+
+
+def run_async_mode(script: str, database: Path) -> subprocess.CompletedProcess:
+    env = {
+        "PATH": "", "DB_MODE": "async", "DATABASE_URL": f"sqlite:///{database}", "DATABASE_REPLICA_URL": "",
+        "GEMINI_API_KEY": "test-key", "BCRYPT_ROUNDS": "4",
+    }
+    return subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND, env=env, capture_output=True, text=True, timeout=30,
+    )
+
+
+def test_concurrent_requests_on_a_cold_catalog(catalog_db, tmp_path):
+    database = tmp_path / "async.db"
+    shutil.copy(make_url(str(catalog_db.url)).database, database)
+
+    result = run_async_mode(CONCURRENT_COLD_CATALOG, database)
+
+    assert result.returncode == 0, result.stderr[-2000:]
+    (statuses,) = result.stdout.strip().splitlines()[-1:]
+    assert statuses.startswith("[(200, ") and statuses.count("200") == 1, statuses
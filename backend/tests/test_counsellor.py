@@ -0,0 +1,154 @@
+"""Counsellor streaming metrics and registration logging, with Gemini replaced by a fake model."""
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+
+from ai_counsellor import AICounsellor
+from metrics import gemini_fallbacks, gemini_latency
+from models import ShortlistedUniversity, University, User, UserProfile
+from rate_limiter import QueueFull
+from semantic_cache import SemanticCache
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, error=None, second_chunk=None):
+        self.error = error
+        self.prompts = []
+        # When given, the stream blocks before its second chunk until the event is set
+        self.second_chunk = second_chunk
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.prompts.append(prompt)
+        if self.error:
+            raise Exception(self.error)
+        if not stream:
+            return FakeChunk(f"answer {len(self.prompts)}")
+        return self._chunks()
+
+    def _chunks(self):
+        yield FakeChunk("Hello ")
+        if self.second_chunk is not None:
+            self.second_chunk.wait(5)
+        yield FakeChunk("world")
+
+
+@pytest.fixture
+def counsellor(monkeypatch):
+    counsellor = AICounsellor()
+    models = {}
+    monkeypatch.setattr(counsellor, "_get_model", lambda name: models.setdefault(name, FakeModel()))
+    counsellor.fake_models = models
+    primary, fallback = counsellor._candidate_models()[:2]
+    return counsellor, primary, fallback
+
+
+def observations(model: str, outcome: str) -> int:
+    series = gemini_latency._series.get((model, outcome))
+    return sum(series[0]) if series else 0
+
+
+def fallbacks(model: str, reason: str) -> float:
+    return gemini_fallbacks._values.get((model, reason), 0)
+
+
+def collect(stream) -> list:
+    async def run():
+        return [text async for text in stream]
+
+    return asyncio.run(run())
+
+
+def test_stream_records_latency_and_fallbacks(counsellor):
+    counsellor, primary, fallback = counsellor
+    counsellor.fake_models[primary] = FakeModel("429 quota exceeded")
+    before = (observations(primary, "rate_limited"), observations(fallback, "ok"), fallbacks(primary, "rate_limited"))
+
+    assert collect(counsellor._generate_stream_async("hi")) == ["Hello ", "world"]
+
+    after = (observations(primary, "rate_limited"), observations(fallback, "ok"), fallbacks(primary, "rate_limited"))
+    assert [b - a for a, b in zip(before, after)] == [1, 1, 1]
+
+
+def test_stream_counts_queue_full_fallbacks(counsellor, monkeypatch):
+    counsellor, primary, fallback = counsellor
+    acquire = counsellor.limiter.acquire
+
+    async def full_for_primary(model_name, *args):
+        if model_name == primary:
+            raise QueueFull(model_name)
+        await acquire(model_name, *args)
+
+    monkeypatch.setattr(counsellor.limiter, "acquire", full_for_primary)
+    before = fallbacks(primary, "queue_full")
+    assert collect(counsellor._generate_stream_async("hi")) == ["Hello ", "world"]
+    assert fallbacks(primary, "queue_full") == before + 1
+
+
+def test_abandoned_stream_is_recorded_as_cancelled(counsellor):
+    counsellor, primary, _ = counsellor
+    second_chunk = threading.Event()
+    counsellor.fake_models[primary] = FakeModel(second_chunk=second_chunk)
+    before = observations(primary, "cancelled")
+
+    async def first_chunk_only():
+        stream = counsellor._generate_stream_async("hi")
+        text = await stream.__anext__()
+        await stream.aclose()
+        second_chunk.set()  # the producer can only see the stop flag once this chunk arrives
+        return text
+
+    assert asyncio.run(first_chunk_only()) == "Hello "
+    deadline = time.monotonic() + 2
+    while observations(primary, "cancelled") == before and time.monotonic() < deadline:
+        time.sleep(0.01)  # the pool thread closes the generator after the item it is reading
+    assert observations(primary, "cancelled") == before + 1
+
+
+def test_register_does_not_log_the_password(api, caplog):
+    caplog.set_level(logging.INFO, logger="uvicorn.error")
+    response = api("POST", "/api/auth/register", json={
+        "email": "logging-check@example.com", "password": "plaintext-secret", "full_name": "Log Check",
+    })
+    assert response.status_code == 201
+    assert f"registered user {response.json()['id']}" in caplog.text
+    assert "plaintext-secret" not in caplog.text
+
+
+def make_student(db, shortlist: list[str]) -> int:
+    user = User(email=f"{'-'.join(shortlist) or 'none'}-{time.time_ns()}@example.com", hashed_password="-", full_name="S")
+    db.add(user)
+    db.flush()
+    db.add(UserProfile(user_id=user.id, current_gpa=3.6, budget_max=40_000, currency="USD",
+                       desired_field="Computer Science", preferred_countries='["Germany"]'))
+    for name in shortlist:
+        university = db.query(University).filter(University.name == name).one()
+        db.add(ShortlistedUniversity(user_id=user.id, university_id=university.id, category="target"))
+    db.commit()
+    return user.id
+
+
+def test_semantic_cache_never_shares_answers_built_from_another_students_lists(counsellor, db):
+    counsellor, primary, _ = counsellor
+    counsellor.semantic_cache = SemanticCache(enabled=True)
+    model = counsellor.fake_models[primary] = FakeModel()
+    alice = make_student(db, ["Technical University of Munich"])
+    bob = make_student(db, ["Heidelberg University"])
+    twin = make_student(db, ["Technical University of Munich"])
+
+    def ask(user_id, stage="dashboard"):
+        return asyncio.run(counsellor.chat("Which university should I apply to first?", stage, db, user_id))
+
+    first = ask(alice)
+    assert "Technical University of Munich" in model.prompts[-1]
+    assert ask(bob) != first  # same profile bucket, different shortlist
+    assert ask(alice, stage="application") != first
+    assert ask(twin) == first  # identical profile features, lists and stage
+    assert len(model.prompts) == 3
@@ -0,0 +1,36 @@
+"""Pool settings and checkout telemetry (db_pool.py)."""
+from sqlalchemy import create_engine, text
+
+import db_pool
+from metrics import db_pool_checkout_wait
+
+
+def checkout_waits(engine_name: str) -> int:
+    series = db_pool_checkout_wait._series.get((engine_name,))
+    return sum(series[0]) if series else 0
+
+
+def test_pgbouncer_mode_has_no_pool_and_no_pre_ping(monkeypatch):
+    monkeypatch.setattr(db_pool, "DB_PGBOUNCER", True)
+    options = db_pool.engine_options("postgresql+asyncpg://u:p@pgbouncer/db", is_async=True)
+    assert options["poolclass"] is db_pool.NullPool
+    assert "pool_pre_ping" not in options
+    assert options["connect_args"]["statement_cache_size"] == 0
+
+
+def test_checkout_waits_are_exported_per_engine(tmp_path, api):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **db_pool.engine_options(f"sqlite:///{tmp_path}/pool.db"))
+    db_pool.label_pool(engine, "test_pool")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert checkout_waits("test_pool") == 1
+
+    engine.dispose()  # a recreated pool keeps its label
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert checkout_waits("test_pool") == 2
+
+    api("GET", "/health")
+    body = api("GET", "/metrics").text
+    assert 'db_pool_checkout_wait_seconds_count{engine="test_pool"} 2' in body
+    assert 'db_pool_checkout_wait_seconds_bucket{engine="primary",le="+Inf"}' in body
@@ -0,0 +1,110 @@
+"""`alembic upgrade head` on an empty SQLite database, and the per-user reads it indexes."""
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, select, text
+
+from database import Base
+from fx_rates import USD_COLUMNS, to_usd
+from models import LockedUniversity, ShortlistedUniversity, TodoTask, University
+
+MIGRATIONS = Path(__file__).resolve().parent.parent / "migrations"
+
+
+def upgrade_head(url: str) -> None:
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+
+@pytest.fixture(scope="module")
+def migrated_engine(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('migrations') / 'migrated.db'}"
+    upgrade_head(url)
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+def query_plan(engine, statement) -> str:
+    sql = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        return " | ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+def test_upgrade_creates_every_table(migrated_engine):
+    tables = set(inspect(migrated_engine).get_table_names())
+    assert {
+        "users", "user_profiles", "universities", "university_programs", "shortlisted_universities",
+        "locked_universities", "todo_tasks", "catalog_version", "alembic_version",
+    } <= tables
+
+
+@pytest.mark.parametrize("statement, index", [
+    (
+        select(University)
+        .join(ShortlistedUniversity, ShortlistedUniversity.university_id == University.id)
+        .where(ShortlistedUniversity.user_id == 1),
+        "uq_shortlisted_universities_user_university",
+    ),
+    (
+        select(ShortlistedUniversity)
+        .where(ShortlistedUniversity.user_id == 1, ShortlistedUniversity.university_id == 2),
+        "uq_shortlisted_universities_user_university",
+    ),
+    (
+        select(University)
+        .join(LockedUniversity, LockedUniversity.university_id == University.id)
+        .where(LockedUniversity.user_id == 1),
+        "uq_locked_universities_user_university",
+    ),
+    (
+        select(LockedUniversity).where(LockedUniversity.user_id == 1, LockedUniversity.university_id == 2),
+        "uq_locked_universities_user_university",
+    ),
+    (select(TodoTask).where(TodoTask.user_id == 1), "ix_todo_tasks_user_id_status"),
+    (select(TodoTask).where(TodoTask.user_id == 1, TodoTask.status == "pending"), "ix_todo_tasks_user_id_status"),
+], ids=["shortlist", "shortlist-check", "locked", "lock-check", "todos", "todos-by-status"])
+def test_per_user_reads_use_index(migrated_engine, statement, index):
+    plan = query_plan(migrated_engine, statement)
+    assert f"USING INDEX {index}" in plan or f"USING COVERING INDEX {index}" in plan, plan
+
+
+def test_upgrade_fills_usd_columns_of_a_pre_migrations_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # The universities table as create_all made it before the USD columns existed
+        for column, _ in USD_COLUMNS:
+            conn.execute(text(f"DROP INDEX IF EXISTS ix_universities_{column}"))
+            conn.execute(text(f"ALTER TABLE universities DROP COLUMN {column}"))
+        conn.execute(text(
+            "INSERT INTO universities (name, country, tuition_min, tuition_max, living_cost_estimate, currency) "
+            "VALUES ('Sorbonne', 'France', 200, 3800, 12000, 'EUR'), ('Unknown Rate U', 'Nowhere', 1, 2, 3, 'XXX')"
+        ))
+
+    upgrade_head(url)
+
+    with engine.connect() as conn:
+        rows = {r.name: r for r in conn.execute(text("SELECT * FROM universities"))}
+        assert conn.execute(text("SELECT version FROM catalog_version WHERE id = 1")).scalar() == 1
+    engine.dispose()
+    assert rows["Sorbonne"].tuition_max_usd == to_usd(3800, "EUR")
+    assert rows["Sorbonne"].living_cost_usd == to_usd(12000, "EUR")
+    assert rows["Unknown Rate U"].tuition_max_usd is None
+
+
+def test_startup_refresh_notices_null_usd_columns(db):
+    from fx_rates import refresh_usd_columns, usd_columns_missing
+
+    assert not usd_columns_missing(db)
+    university = db.query(University).filter(University.currency == "EUR").first()
+    university.tuition_max_usd = None
+    db.commit()
+    assert usd_columns_missing(db)
+    assert refresh_usd_columns(db) == 1
+    assert not usd_columns_missing(db)
@@ -0,0 +1,27 @@
+"""SQL statement budgets for hot endpoints, counted by query_stats."""
+import pytest
+
+
+def test_todos_with_warm_user_cache(api, query_budget, user_headers):
+    assert api("GET", "/api/todos", headers=user_headers).status_code == 200  # loads the user snapshot
+
+    with query_budget(1, "GET /api/todos") as queries:
+        response = api("GET", "/api/todos", headers=user_headers)
+
+    assert response.status_code == 200
+    assert [todo["title"] for todo in response.json()] == ["Write statement of purpose"]
+    assert queries.count == 1
+
+
+def test_todos_with_cold_user_cache(api, query_budget, user_headers):
+    with query_budget(2, "GET /api/todos"):
+        assert api("GET", "/api/todos", headers=user_headers).status_code == 200
+
+
+def test_budget_overrun_names_the_repeated_statement(db, query_budget):
+    from models import University
+
+    with pytest.raises(AssertionError, match=r"ran 3 SQL statements, budget 2 \(repeated: 3 x SELECT"):
+        with query_budget(2, "lookups"):
+            for university_id in (1, 2, 3):
+                db.query(University).filter(University.id == university_id).first()
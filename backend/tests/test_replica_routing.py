@@ -0,0 +1,67 @@
+"""Read-your-writes with a lagging replica: X-Primary-Until carries the window across processes."""
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from db_routing import REPLICA_STICKY_SECONDS, ReadYourWritesMiddleware, RoutingSession
+
+metadata = MetaData()
+items = Table("items", metadata, Column("id", Integer, primary_key=True), Column("name", String))
+
+
+@pytest.fixture
+def routed_app(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")  # never receives the writes
+    for engine in (primary, replica):
+        metadata.create_all(engine)
+    Session = sessionmaker(class_=RoutingSession, bind=primary, replica=replica)
+
+    # Sync endpoints run in the threadpool, like most of main.py's routes
+    def write(request):
+        with Session() as db:
+            db.execute(insert(items).values(name="shortlist"))
+            db.commit()
+        return JSONResponse({})
+
+    def read(request):
+        with Session() as db:
+            return JSONResponse({"count": db.execute(select(func.count()).select_from(items)).scalar()})
+
+    app = Starlette(routes=[Route("/write", write, methods=["POST"]), Route("/read", read)])
+    yield ReadYourWritesMiddleware(app)
+    primary.dispose()
+    replica.dispose()
+
+
+def call(app, method: str, url: str, **kwargs) -> httpx.Response:
+    async def send() -> httpx.Response:
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await client.request(method, url, **kwargs)
+
+    return asyncio.run(send())
+
+
+def test_writer_reads_its_write_on_any_process(routed_app):
+    wrote = call(routed_app, "POST", "/write")
+    until = float(wrote.headers["x-primary-until"])
+    assert time.time() < until <= time.time() + REPLICA_STICKY_SECONDS
+
+    # Nothing in this process ties the next request to the writer: only the echoed header does
+    assert call(routed_app, "GET", "/read").json() == {"count": 0}
+    echoed = call(routed_app, "GET", "/read", headers={"X-Primary-Until": wrote.headers["x-primary-until"]})
+    assert echoed.json() == {"count": 1}
+    assert "x-primary-until" not in echoed.headers
+
+
+@pytest.mark.parametrize("value", ["garbage", "", str(time.time() - 1), str(time.time() + 3600)])
+def test_stale_or_forged_deadlines_read_from_the_replica(routed_app, value):
+    call(routed_app, "POST", "/write")
+    assert call(routed_app, "GET", "/read", headers={"X-Primary-Until": value}).json() == {"count": 0}
@@ -0,0 +1,76 @@
+"""The scalar, vectorized (NumPy) and SQL match scorers must agree on every university."""
+import random
+
+import pytest
+
+from catalog_index import get_catalog
+from fx_rates import USD_PER_UNIT
+from models import University, UserProfile
+from university_service import UniversityService, match_score_expression
+
+
+def random_profiles(count: int, seed: int = 14) -> list:
+    rng = random.Random(seed)
+    currencies = sorted(USD_PER_UNIT) + [None, "XXX"]
+    profiles = [None, UserProfile(), UserProfile(current_gpa=0.0, budget_min=0.0, budget_max=0.0)]
+    for _ in range(count):
+        budget_min = rng.choice([None, 0.0, round(rng.uniform(0, 40_000), 2)])
+        budget_max = rng.choice([None, round(rng.uniform(0, 80_000), 2)])
+        profiles.append(UserProfile(
+            current_gpa=rng.choice([None, round(rng.uniform(1.5, 4.0), 2)]),
+            budget_min=budget_min,
+            budget_max=budget_max,
+            currency=rng.choice(currencies),
+        ))
+    return profiles
+
+
+PROFILES = random_profiles(200)
+
+
+@pytest.fixture(scope="module")
+def universities(catalog_db):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        catalog = get_catalog(db)
+        rows = db.query(University).order_by(University.id).all()
+        db.expunge_all()
+        return catalog, rows
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("index", range(len(PROFILES)))
+def test_engines_agree(db, universities, index):
+    profile = PROFILES[index]
+    catalog, rows = universities
+    service = UniversityService()
+
+    scalar = {u.id: service._calculate_match_score(u, profile) for u in rows}
+    vectorized = dict(zip(catalog.ids.tolist(), service.score_catalog(catalog, profile).tolist()))
+    sql = dict(db.query(University.id, match_score_expression(profile)).all())
+
+    assert set(scalar) == set(vectorized) == set(sql)
+    for university_id, expected in scalar.items():
+        assert vectorized[university_id] == pytest.approx(expected, abs=1e-9), university_id
+        assert float(sql[university_id]) == pytest.approx(expected, abs=1e-9), university_id
+
+
+def test_score_profiles_matches_score_catalog(universities):
+    catalog, _ = universities
+    service = UniversityService()
+    matrix = service.score_profiles(catalog, PROFILES[:20])
+    for row, profile in zip(matrix, PROFILES[:20]):
+        assert row.tolist() == service.score_catalog(catalog, profile).tolist()
+
+
+@pytest.mark.parametrize("index", [1, 3, 10, 50])
+def test_sql_and_memory_rankings_agree(db, index):
+    profile = PROFILES[index]
+    ranked = {}
+    for name in ("memory", "sql"):
+        service = UniversityService(engine=name)
+        ranked[name] = [(round(score, 9), u.id) for score, u in service._rank(db, profile, show_all=True)]
+    assert [s for s, _ in ranked["memory"]] == [s for s, _ in ranked["sql"]]
@@ -0,0 +1,34 @@
+"""University search: the in-memory index, and what the Postgres path sends."""
+import university_search
+from university_search import SEARCH_MIN_SIMILARITY, search_universities
+
+
+def test_memory_index_is_typo_tolerant(db):
+    names = [u.name for _, u in search_universities(db, "cambrige")]
+    assert "University of Cambridge" in names[:3]
+
+
+class RecordingSession:
+    """Stands in for the Session on the Postgres path and records each statement."""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        self.executed.append((str(statement), params))
+        return self
+
+    def all(self):
+        return []
+
+
+def test_postgres_search_applies_the_configured_similarity(monkeypatch):
+    monkeypatch.setattr(university_search, "get_catalog", lambda _: None)
+    session = RecordingSession()
+
+    university_search._search_postgres(session, ["cambrige"], 5)
+
+    (set_sql, set_params), (search_sql, _) = session.executed
+    assert "set_config('pg_trgm.word_similarity_threshold', :threshold, true)" in set_sql
+    assert set_params == {"threshold": str(SEARCH_MIN_SIMILARITY)}
+    assert "<% search_text" in search_sql
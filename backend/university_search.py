@@ -0,0 +1,180 @@
+"""
+Free-text university search over name, city, country and programs_offered.
+
+On Postgres with the 0003 migration applied, the database answers from pg_trgm and
+tsvector GIN indexes. Everywhere else (SQLite, dev, migration not run) an in-memory
+n-gram inverted index built from the catalog index serves the same endpoint.
+"""
+import bisect
+import os
+import re
+import threading
+import unicodedata
+from typing import Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from catalog_index import CatalogIndex, get_catalog
+from schemas import UniversityResponse
+
+# "auto" uses Postgres when the search columns exist, the in-memory index otherwise
+UNIVERSITY_SEARCH_BACKEND = os.getenv("UNIVERSITY_SEARCH_BACKEND", "auto").strip().lower()
+# Minimum trigram similarity for a misspelt word to count as a match (0-1)
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.4"))
+
+# Field weights: a hit in the name outranks the same hit in the program list
+FIELD_WEIGHTS = (("name", 3.0), ("city", 2.0), ("country", 2.0), ("programs_offered", 1.0))
+# Score for a word that starts with the query token (an exact word scores 1.0)
+PREFIX_SCORE = 0.9
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(value: Optional[str]) -> list[str]:
+    """Lowercased, accent-stripped alphanumeric words ("Zürich" -> ["zurich"])."""
+    if not value:
+        return []
+    folded = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    return _WORD.findall(folded.lower())
+
+
+def trigrams(word: str) -> set[str]:
+    """pg_trgm-style trigrams: the word padded with two leading spaces and one trailing."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Inverted index over catalog words, plus a trigram index over the vocabulary.
+
+    Query words match vocabulary words exactly, by prefix, or (3+ characters) by trigram
+    similarity, so "stanf", "cambrige" and "computer sci" all find something.
+    """
+
+    def __init__(self, catalog: CatalogIndex):
+        self.version = catalog.version
+        self.responses = catalog.responses
+        postings: dict[str, dict[int, float]] = {}
+        for pos, uni in enumerate(catalog.responses):
+            for field, weight in FIELD_WEIGHTS:
+                for word in tokenize(getattr(uni, field, None)):
+                    docs = postings.setdefault(word, {})
+                    if docs.get(pos, 0.0) < weight:
+                        docs[pos] = weight
+        self.words = sorted(postings)
+        self.postings = [postings[w] for w in self.words]
+        self._word_trigrams = [trigrams(w) for w in self.words]
+        by_trigram: dict[str, list[int]] = {}
+        for word_id, grams in enumerate(self._word_trigrams):
+            for gram in grams:
+                by_trigram.setdefault(gram, []).append(word_id)
+        self.by_trigram = by_trigram
+
+    def _matching_words(self, token: str) -> dict[int, float]:
+        """word id -> match quality (1.0 exact, PREFIX_SCORE prefix, else trigram similarity)"""
+        matches: dict[int, float] = {}
+        i = bisect.bisect_left(self.words, token)
+        while i < len(self.words) and self.words[i].startswith(token):
+            matches[i] = 1.0 if self.words[i] == token else PREFIX_SCORE
+            i += 1
+        if len(token) >= 3:
+            grams = trigrams(token)
+            shared: dict[int, int] = {}
+            for gram in grams:
+                for word_id in self.by_trigram.get(gram, ()):
+                    shared[word_id] = shared.get(word_id, 0) + 1
+            for word_id, common in shared.items():
+                similarity = common / (len(grams) + len(self._word_trigrams[word_id]) - common)
+                if similarity >= SEARCH_MIN_SIMILARITY and similarity > matches.get(word_id, 0.0):
+                    matches[word_id] = similarity
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[float, UniversityResponse]]:
+        """Best matches as (score, university). Universities matching more query words rank first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        matched: dict[int, int] = {}
+        scores: dict[int, float] = {}
+        for token in tokens:
+            best: dict[int, float] = {}
+            for word_id, quality in self._matching_words(token).items():
+                for pos, weight in self.postings[word_id].items():
+                    value = quality * weight
+                    if value > best.get(pos, 0.0):
+                        best[pos] = value
+            for pos, value in best.items():
+                matched[pos] = matched.get(pos, 0) + 1
+                scores[pos] = scores.get(pos, 0.0) + value
+        ranked = sorted(scores, key=lambda pos: (-matched[pos], -scores[pos], pos))[:limit]
+        return [(round(scores[pos], 4), self.responses[pos]) for pos in ranked]
+
+
+_lock = threading.Lock()
+_index: Optional[SearchIndex] = None
+_postgres_ready: Optional[bool] = None
+
+
+def get_search_index(db: Session) -> SearchIndex:
+    """Search index for the current catalog, rebuilt when the catalog version changes."""
+    global _index
+    catalog = get_catalog(db)
+    index = _index
+    if index is None or index.version != catalog.version:
+        with _lock:
+            index = _index
+            if index is None or index.version != catalog.version:
+                index = _index = SearchIndex(catalog)
+    return index
+
+
+def _use_postgres(db: Session) -> bool:
+    global _postgres_ready
+    if UNIVERSITY_SEARCH_BACKEND == "python":
+        return False
+    if _postgres_ready is None:
+        bind = db.get_bind()
+        _postgres_ready = bind.dialect.name == "postgresql" and "search_vector" in {
+            c["name"] for c in inspect(bind).get_columns("universities")
+        }
+    return _postgres_ready
+
+
+# `<%` (the one that can use the trigram index) compares against pg_trgm's
+# word_similarity_threshold setting, so set it to SEARCH_MIN_SIMILARITY for this transaction
+_SET_SIMILARITY_THRESHOLD = text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)")
+# Uses the generated search_text / search_vector columns and GIN indexes from migration 0003
+_POSTGRES_SEARCH = text("""
+    SELECT id, GREATEST(word_similarity(:q, search_text), ts_rank(search_vector, to_tsquery('simple', :tsq))) AS score
+    FROM universities
+    WHERE search_vector @@ to_tsquery('simple', :tsq) OR :q <% search_text
+    ORDER BY score DESC, id
+    LIMIT :limit
+""")
+
+
+def _search_postgres(db: Session, tokens: list[str], limit: int) -> list[tuple[float, UniversityResponse]]:
+    catalog = get_catalog(db)
+    db.execute(_SET_SIMILARITY_THRESHOLD, {"threshold": str(SEARCH_MIN_SIMILARITY)})
+    rows = db.execute(_POSTGRES_SEARCH, {
+        "q": " ".join(tokens),
+        "tsq": " & ".join(f"{t}:*" for t in tokens),
+        "limit": limit,
+    }).all()
+    results = []
+    for uni_id, score in rows:
+        pos = catalog.position_by_id.get(uni_id)
+        if pos is not None:
+            results.append((round(float(score), 4), catalog.responses[pos]))
+    return results
+
+
+def search_universities(db: Session, query: str, limit: int = 20) -> list[tuple[float, UniversityResponse]]:
+    """Prefix, typo-tolerant, multi-field search; returns (score, university), best first."""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if _use_postgres(db):
+        return _search_postgres(db, tokens, limit)
+    return get_search_index(db).search(query, limit)
@@ -1,39 +1,171 @@
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+import base64
+import hashlib
+import heapq
+import json
+import os
+from typing import Optional, List, Sequence, Tuple, Union
+import numpy as np
+from sqlalchemy import Float, and_, case, cast, literal, or_, select
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.elements import ColumnElement
 
-from models import University, UserProfile
+from models import University, UniversityProgram, UserProfile
 from schemas import UniversityResponse
+from catalog_index import CatalogIndex, get_catalog
+from cache import TTLCache
+from fx_rates import budget_usd
+from programs import program_key
+
+# Ranked lists kept for cursor pagination: later pages slice the cached ranking instead of re-scoring
+RANKING_MAX_RESULTS = int(os.getenv("RANKING_MAX_RESULTS", "500"))
+RANKING_CACHE_SIZE = int(os.getenv("RANKING_CACHE_SIZE", "1024"))
+RANKING_CACHE_TTL_SECONDS = float(os.getenv("RANKING_CACHE_TTL_SECONDS", "300"))
+
+# Where match scores are computed: "memory" (NumPy over the in-memory catalog index) or
+# "sql" (a computed ORDER BY expression, so the database returns only the top rows).
+UNIVERSITY_SCORING_ENGINE = os.getenv("UNIVERSITY_SCORING_ENGINE", "memory").strip().lower()
+
+
+def match_score_expression(profile: Optional[UserProfile]) -> ColumnElement:
+    """_calculate_match_score as a SQL expression over the universities columns.
+
+    Same weights and the same "missing or zero counts as absent" rules; profile values
+    are converted to USD and bound as parameters.
+    """
+    if profile is None:
+        return literal(0.5, Float)
+    
+    def present(column) -> ColumnElement:
+        return and_(column.isnot(None), column != 0)
+    
+    zero = literal(0.0, Float)
+    tuition_max = cast(University.tuition_max_usd, Float)
+    min_gpa = cast(University.min_gpa, Float)
+    ranking = cast(University.ranking, Float)
+    acceptance = cast(University.acceptance_rate, Float)
+    
+    # Budget match (40% weight)
+    budget_term = zero
+    budget_max = budget_usd(profile, profile.budget_max)
+    if budget_max:
+        budget_min = budget_usd(profile, profile.budget_min) or 0
+        if budget_max > budget_min:
+            budget_match = 1.0 - (tuition_max - budget_min) / float(budget_max - budget_min)
+        else:
+            budget_match = literal(1.0, Float)
+        budget_term = case(
+            (and_(present(University.tuition_max_usd), tuition_max <= budget_max), budget_match * 0.4),
+            else_=zero,
+        )
+    
+    # GPA match (20% weight)
+    gpa_term = zero
+    if profile.current_gpa:
+        ratio = float(profile.current_gpa) / (min_gpa + 0.5)
+        gpa_term = case(
+            (
+                and_(present(University.min_gpa), min_gpa <= profile.current_gpa),
+                case((ratio >= 1.0, literal(1.0, Float)), else_=ratio) * 0.2,
+            ),
+            else_=zero,
+        )
+    
+    # Ranking (20% weight) - higher ranking = better
+    ranking_score = 1.0 - (ranking - 1.0) / 1000.0
+    ranking_term = case(
+        (present(University.ranking), case((ranking_score > 0, ranking_score), else_=zero) * 0.2),
+        else_=zero,
+    )
+    
+    # Acceptance rate (20% weight) - higher acceptance = better for student
+    acceptance_term = case((present(University.acceptance_rate), acceptance * 0.2), else_=zero)
+    
+    return (budget_term + gpa_term + ranking_term + acceptance_term).label("match_score")
+
+
+class InvalidCursor(ValueError):
+    """Cursor is malformed or belongs to a different ranking (other filters or profile)."""
+
 
 class UniversityService:
-    def get_recommended_universities(
+    def __init__(self, engine: Optional[str] = None):
+        self.engine = (engine or UNIVERSITY_SCORING_ENGINE)
+        self._ranking_cache = TTLCache(maxsize=RANKING_CACHE_SIZE, ttl=RANKING_CACHE_TTL_SECONDS)
+    
+    def _filter_mask(
+        self,
+        catalog: CatalogIndex,
+        profile: Optional[UserProfile],
+        country: Optional[str],
+        budget_min: Optional[float],
+        budget_max: Optional[float],
+        show_all: bool,
+        program: Optional[str] = None
+    ) -> np.ndarray:
+        if show_all:
+            return np.ones(len(catalog), dtype=bool)
+        return catalog.filter_mask(
+            gpa=getattr(profile, 'current_gpa', None) if profile else None,
+            country=country,
+            budget_min=budget_usd(profile, budget_min),
+            budget_max=budget_usd(profile, budget_max),
+            profile_budget_min=budget_usd(profile, getattr(profile, 'budget_min', None)) if profile else None,
+            profile_budget_max=budget_usd(profile, getattr(profile, 'budget_max', None)) if profile else None,
+            program=program,
+        )
+    
+    def _top_k(
+        self,
+        catalog: CatalogIndex,
+        profile: Optional[UserProfile],
+        mask: np.ndarray,
+        k: int
+    ) -> List[Tuple[float, int]]:
+        """Score every row passing `mask` and keep the best k as (score, position), best first.
+
+        Uses a bounded heap (O(n log k)); ties go to the lower id, as with a stable sort.
+        """
+        positions = np.flatnonzero(mask)
+        scores = self.score_catalog(catalog, profile)[positions]
+        top = heapq.nlargest(k, zip(scores.tolist(), (-positions).tolist()))
+        return [(score, -neg_position) for score, neg_position in top]
+    
+    def _sql_query(
         self,
         db: Session,
-        profile: UserProfile,
-        country: Optional[str] = None,
-        budget_min: Optional[float] = None,
-        budget_max: Optional[float] = None,
-        show_all: bool = False
-    ) -> List[UniversityResponse]:
-        """Get universities filtered by profile and preferences, or all if show_all=True"""
-        query = db.query(University)
+        profile: Optional[UserProfile],
+        country: Optional[str],
+        budget_min: Optional[float],
+        budget_max: Optional[float],
+        show_all: bool,
+        program: Optional[str] = None
+    ) -> Query:
+        """(University, match_score) rows passing the filters, best first, scored by the database"""
+        score = match_score_expression(profile)
+        query = db.query(University, score)
         
         if not show_all:
             # Filter by country if specified
             if country:
                 query = query.filter(University.country.ilike(f"%{country}%"))
             
-            # Filter by budget
+            # Filter by program offered (indexed lookup on university_programs.name_key)
+            if program:
+                query = query.filter(University.id.in_(
+                    select(UniversityProgram.university_id).where(UniversityProgram.name_key == program_key(program))
+                ))
+            
+            # Filter by budget (in the profile's currency; compared in USD)
             if budget_min is not None:
-                query = query.filter(University.tuition_max >= budget_min)
+                query = query.filter(University.tuition_max_usd >= budget_usd(profile, budget_min))
             if budget_max is not None:
-                query = query.filter(University.tuition_min <= budget_max)
+                query = query.filter(University.tuition_min_usd <= budget_usd(profile, budget_max))
             
             # If no budget filters from user, use profile budget
             if budget_min is None and budget_max is None and profile and getattr(profile, 'budget_max', None):
-                query = query.filter(University.tuition_max <= profile.budget_max)
+                query = query.filter(University.tuition_max_usd <= budget_usd(profile, profile.budget_max))
             if budget_min is None and budget_max is None and profile and getattr(profile, 'budget_min', None):
-                query = query.filter(University.tuition_min >= profile.budget_min)
+                query = query.filter(University.tuition_min_usd >= budget_usd(profile, profile.budget_min))
             
             # Filter by GPA if available
             if profile and getattr(profile, 'current_gpa', None):
@@ -44,29 +176,181 @@ class UniversityService:
                     )
                 )
         
-        universities = query.limit(100 if show_all else 50).all()
+        return query.order_by(score.desc(), University.id.asc())
+    
+    def _rank(
+        self,
+        db: Session,
+        profile: UserProfile,
+        country: Optional[str] = None,
+        budget_min: Optional[float] = None,
+        budget_max: Optional[float] = None,
+        show_all: bool = False,
+        program: Optional[str] = None
+    ) -> List[Tuple[float, UniversityResponse]]:
+        """Filter universities by profile and preferences and return (match score, university), best first.
+
+        Every university passing the filters is scored, then the best 50 (100 with show_all) are kept.
+        With the "memory" engine this runs against the in-memory catalog index; with "sql" the
+        database scores, sorts and limits.
+        """
+        k = 100 if show_all else 50
+        if self.engine == "sql":
+            rows = self._sql_query(db, profile, country, budget_min, budget_max, show_all, program).limit(k).all()
+            return [(float(score), UniversityResponse.model_validate(uni)) for uni, score in rows]
+        
+        catalog = get_catalog(db)
+        mask = self._filter_mask(catalog, profile, country, budget_min, budget_max, show_all, program)
+        top = self._top_k(catalog, profile, mask, k)
+        return [(score, catalog.responses[pos]) for score, pos in top]
+    
+    def rank_page(
+        self,
+        db: Session,
+        profile: UserProfile,
+        country: Optional[str] = None,
+        budget_min: Optional[float] = None,
+        budget_max: Optional[float] = None,
+        show_all: bool = False,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        program: Optional[str] = None
+    ) -> Tuple[List[UniversityResponse], Optional[str], int]:
+        """One page of the full ranking: (universities, next cursor or None, total ranked).
+
+        The first request ranks everything passing the filters (top RANKING_MAX_RESULTS) and
+        caches the order; cursors for later pages point into that cached ranking.
+        """
+        if self.engine == "sql":
+            return self._sql_page(db, profile, country, budget_min, budget_max, show_all, limit, cursor, program)
+        
+        catalog = get_catalog(db)
+        key = repr((
+            catalog.version,
+            getattr(profile, 'current_gpa', None) if profile else None,
+            getattr(profile, 'budget_min', None) if profile else None,
+            getattr(profile, 'budget_max', None) if profile else None,
+            getattr(profile, 'currency', None) if profile else None,
+            profile is None,
+            country, budget_min, budget_max, show_all, program_key(program or ''),
+        ))
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
         
-        # Calculate match score for each university
-        scored_universities = []
-        for uni in universities:
-            score = self._calculate_match_score(uni, profile)
-            scored_universities.append((score, uni))
+        offset = self._decode_cursor(cursor, digest) if cursor else 0
+        ranked = self._ranking_cache.get(digest)
+        if ranked is None:
+            mask = self._filter_mask(catalog, profile, country, budget_min, budget_max, show_all, program)
+            ranked = [pos for _, pos in self._top_k(catalog, profile, mask, RANKING_MAX_RESULTS)]
+            self._ranking_cache.set(digest, ranked)
         
-        # Sort by match score (highest first)
-        scored_universities.sort(key=lambda x: x[0], reverse=True)
+        page = [catalog.responses[pos] for pos in ranked[offset:offset + limit]]
+        next_offset = offset + limit
+        next_cursor = self._encode_cursor(next_offset, digest) if next_offset < len(ranked) else None
+        return page, next_cursor, len(ranked)
+    
+    def _sql_page(
+        self,
+        db: Session,
+        profile: Optional[UserProfile],
+        country: Optional[str],
+        budget_min: Optional[float],
+        budget_max: Optional[float],
+        show_all: bool,
+        limit: int,
+        cursor: Optional[str],
+        program: Optional[str] = None
+    ) -> Tuple[List[UniversityResponse], Optional[str], int]:
+        """rank_page for the SQL engine: each page is an ORDER BY score ... OFFSET/LIMIT query"""
+        key = repr((
+            getattr(profile, 'current_gpa', None) if profile else None,
+            getattr(profile, 'budget_min', None) if profile else None,
+            getattr(profile, 'budget_max', None) if profile else None,
+            getattr(profile, 'currency', None) if profile else None,
+            profile is None,
+            country, budget_min, budget_max, show_all, program_key(program or ''),
+        ))
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+        offset = self._decode_cursor(cursor, digest) if cursor else 0
         
-        return [UniversityResponse.model_validate(uni) for _, uni in scored_universities]
+        query = self._sql_query(db, profile, country, budget_min, budget_max, show_all, program)
+        total = min(query.order_by(None).count(), RANKING_MAX_RESULTS)
+        rows = query.offset(offset).limit(max(0, min(limit, total - offset))).all()
+        page = [UniversityResponse.model_validate(uni) for uni, _ in rows]
+        next_offset = offset + limit
+        next_cursor = self._encode_cursor(next_offset, digest) if next_offset < total else None
+        return page, next_cursor, total
+    
+    def _encode_cursor(self, offset: int, digest: str) -> str:
+        raw = json.dumps({"o": offset, "k": digest}, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
     
-    def _calculate_match_score(self, university: University, profile: Optional[UserProfile]) -> float:
+    def _decode_cursor(self, cursor: str, digest: str) -> int:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            offset = int(data["o"])
+        except (ValueError, KeyError, TypeError):
+            raise InvalidCursor("Malformed cursor")
+        if data.get("k") != digest or offset < 0:
+            raise InvalidCursor("Cursor does not match this ranking; start again without a cursor")
+        return offset
+    
+    def get_recommended_universities(
+        self,
+        db: Session,
+        profile: UserProfile,
+        country: Optional[str] = None,
+        budget_min: Optional[float] = None,
+        budget_max: Optional[float] = None,
+        show_all: bool = False,
+        program: Optional[str] = None
+    ) -> List[UniversityResponse]:
+        """Get universities filtered by profile and preferences, or all if show_all=True"""
+        scored = self._rank(db, profile, country, budget_min, budget_max, show_all, program)
+        return [uni for _, uni in scored]
+    
+    def top_candidates(
+        self,
+        db: Session,
+        profile: UserProfile,
+        limit: int = 25
+    ) -> List[Tuple[float, str, UniversityResponse]]:
+        """Cheap pre-ranking for AI recommendations: (score, heuristic category, university) for the best matches
+
+        Universities offering the profile's desired field come first; other matches fill the rest.
+        """
+        scored = []
+        desired_field = getattr(profile, 'desired_field', None) if profile else None
+        if desired_field:
+            scored = self._rank(db, profile, program=desired_field)
+        if len(scored) < limit:
+            seen = {uni.id for _, uni in scored}
+            scored += [(score, uni) for score, uni in self._rank(db, profile) if uni.id not in seen]
+        if not scored:
+            # Profile filters matched nothing; rank the whole catalog instead
+            scored = self._rank(db, profile, show_all=True)
+        return [
+            (score, self.categorize_university(uni, profile), uni)
+            for score, uni in scored[:limit]
+        ]
+    
+    def _calculate_match_score(
+        self,
+        university: Union[University, UniversityResponse],
+        profile: Optional[UserProfile]
+    ) -> float:
         """Calculate how well a university matches the user profile"""
         if profile is None:
             return 0.5
         score = 0.0
         
-        # Budget match (40% weight)
-        if profile.budget_max and university.tuition_max:
-            if university.tuition_max <= profile.budget_max:
-                budget_match = 1.0 - (university.tuition_max - profile.budget_min) / (profile.budget_max - profile.budget_min) if profile.budget_max > profile.budget_min else 1.0
+        # Budget match (40% weight), in USD; a missing budget_min counts as 0
+        budget_max = budget_usd(profile, profile.budget_max)
+        tuition_max = university.tuition_max_usd
+        if budget_max and tuition_max:
+            if tuition_max <= budget_max:
+                budget_min = budget_usd(profile, profile.budget_min) or 0
+                budget_match = 1.0 - (tuition_max - budget_min) / (budget_max - budget_min) if budget_max > budget_min else 1.0
                 score += budget_match * 0.4
         
         # GPA match (20% weight)
@@ -86,9 +370,63 @@ class UniversityService:
         
         return score
     
+    def score_profiles(self, catalog: CatalogIndex, profiles: Sequence[Optional[UserProfile]]) -> np.ndarray:
+        """Match scores for every (profile, university) pair as a (profiles x catalog) matrix.
+
+        Array version of _calculate_match_score with the same weights and operation order,
+        so each cell equals the scalar result for that pair.
+        """
+        def column(attr: str, usd: bool = False) -> np.ndarray:
+            values = [getattr(p, attr, None) if p is not None else None for p in profiles]
+            if usd:
+                values = [budget_usd(p, v) for p, v in zip(profiles, values)]
+            return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)[:, None]
+        
+        gpa = column("current_gpa")
+        budget_max = column("budget_max", usd=True)
+        budget_min = np.nan_to_num(column("budget_min", usd=True), nan=0.0)
+        
+        tuition_max = catalog.tuition_max_usd[None, :]
+        min_gpa = catalog.min_gpa[None, :]
+        ranking = catalog.ranking[None, :]
+        acceptance = catalog.acceptance_rate[None, :]
+        
+        def present(a: np.ndarray) -> np.ndarray:
+            # Python truthiness of the scalar version: None (NaN here) and 0 both count as missing
+            return ~np.isnan(a) & (a != 0)
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Budget match (40% weight)
+            budget_match = np.where(
+                budget_max > budget_min,
+                1.0 - (tuition_max - budget_min) / (budget_max - budget_min),
+                1.0,
+            )
+            budget_ok = present(budget_max) & present(tuition_max) & (tuition_max <= budget_max)
+            score = 0.0 + np.where(budget_ok, budget_match * 0.4, 0.0)
+            
+            # GPA match (20% weight)
+            gpa_ok = present(gpa) & present(min_gpa) & (gpa >= min_gpa)
+            score = score + np.where(gpa_ok, np.minimum(1.0, gpa / (min_gpa + 0.5)) * 0.2, 0.0)
+        
+        # Ranking (20% weight) - higher ranking = better
+        ranking_score = np.maximum(0, 1.0 - (ranking - 1) / 1000)
+        score = score + np.where(present(ranking), ranking_score * 0.2, 0.0)
+        
+        # Acceptance rate (20% weight) - higher acceptance = better for student
+        score = score + np.where(present(acceptance), acceptance * 0.2, 0.0)
+        
+        # No profile at all: neutral score, as in the scalar version
+        no_profile = np.array([p is None for p in profiles])[:, None]
+        return np.where(no_profile, 0.5, score)
+    
+    def score_catalog(self, catalog: CatalogIndex, profile: Optional[UserProfile]) -> np.ndarray:
+        """Match score of every catalog row for one profile"""
+        return self.score_profiles(catalog, [profile])[0]
+    
     def categorize_university(
         self,
-        university: University,
+        university: Union[University, UniversityResponse],
         profile: UserProfile
     ) -> str:
         """Categorize university as dream, target, or safe"""
@@ -12,8 +12,15 @@ const api = axios.create({
 
 
 
+// Read-your-writes with a read replica: after a write the backend sends X-Primary-Until
+// (epoch seconds); echoing it until then keeps our reads on the primary database.
+let primaryUntil = 0;
+
 // Add token to requests (use store token if not in localStorage — e.g. after refresh from persist)
 api.interceptors.request.use((config) => {
+  if (primaryUntil > Date.now() / 1000) {
+    config.headers['X-Primary-Until'] = String(primaryUntil);
+  }
   let token = localStorage.getItem('token');
   if (!token && typeof window !== 'undefined') {
     token = useAuthStore.getState().token ?? null;
@@ -28,7 +35,11 @@ api.interceptors.request.use((config) => {
 // On 401: clear session only. Do NOT redirect — user stays on current page.
 // Login page is only shown when user clicks "Login" from the landing page.
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const until = Number(response.headers['x-primary-until']);
+    if (until > primaryUntil) primaryUntil = until;
+    return response;
+  },
   (error) => {
     if (error.response?.status === 401) {
       useAuthStore.getState().logout();